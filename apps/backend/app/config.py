@@ -1,8 +1,25 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from typing import Optional
 
 
+class RateLimitPolicy(BaseModel):
+    """Rate limit rule for requests matching a method, path glob and query.
+
+    Requests spend `cost` from the client's budget in `bucket`; a cost of 0
+    exempts them. `limit` defaults to `rate_limit_requests`.
+    """
+
+    name: str
+    methods: list[str] = []
+    path: str = "*"
+    query: dict[str, str] = {}
+    bucket: str = "default"
+    limit: Optional[int] = None
+    cost: int = 1
+
+
 class Settings(BaseSettings):
     app_name: str = "RateIt API"
     app_version: str = "1.0.0"
@@ -11,6 +28,21 @@ class Settings(BaseSettings):
     database_url: str
     database_pool_size: int = 10
     database_max_overflow: int = 20
+    # Connections opened before the pool is reported ready
+    database_pool_min_size: int = 2
+    database_connect_timeout: float = 5.0
+    # Backoff ceiling between reconnect attempts while the database is down
+    database_reconnect_max_delay: float = 30.0
+    # Consecutive connection failures that open the circuit, and seconds it
+    # stays open before one request is let through to probe the database
+    database_breaker_threshold: int = 5
+    database_breaker_reset_timeout: float = 10.0
+    # Read replicas; GET requests are served from these when set. Needs
+    # redis_url, which holds the read-your-writes pins for all workers
+    database_replica_urls: list[str] = []
+    database_replica_pool_size: int = 10
+    # Seconds after a write during which that client's reads go to the primary
+    database_read_your_writes_window: int = 5
 
     supabase_url: Optional[str] = None
     supabase_key: Optional[str] = None
@@ -25,10 +57,82 @@ class Settings(BaseSettings):
 
     rate_limit_requests: int = 100
     rate_limit_window: int = 60
+    # First matching policy wins; unmatched requests cost 1 from "default"
+    rate_limit_policies: list[RateLimitPolicy] = [
+        RateLimitPolicy(name="health", path="/health", cost=0),
+        RateLimitPolicy(name="ready", path="/ready", cost=0),
+        # Immutable and mostly answered with 304, but one feed page pulls
+        # dozens, so images get their own generous bucket
+        RateLimitPolicy(
+            name="images",
+            methods=["GET", "HEAD"],
+            path="/api/v1/images/*",
+            bucket="images",
+            limit=2000,
+        ),
+        RateLimitPolicy(
+            name="upload",
+            methods=["POST"],
+            path="/api/v1/upload/*",
+            bucket="writes",
+            limit=20,
+            cost=4,
+        ),
+        RateLimitPolicy(name="writes", methods=["POST"], bucket="writes", limit=20),
+        RateLimitPolicy(
+            name="random_feed",
+            methods=["GET"],
+            path="/api/v1/posts",
+            query={"type": "random"},
+            cost=5,
+        ),
+        RateLimitPolicy(
+            name="results", methods=["GET"], path="/api/v1/posts/*/results", cost=2
+        ),
+        RateLimitPolicy(
+            name="analytics", methods=["GET"], path="/api/v1/admin/analytics/*", cost=10
+        ),
+    ]
+    # Upper bound on clients tracked by the limiter
+    rate_limit_max_keys: int = 100_000
+    # Without redis_url, workers on one host share limits through this file;
+    # its directory must be private to the app's user (created 0700 if
+    # missing). Empty keeps limits per process
+    rate_limit_state_file: str = "/tmp/rateit/rate-limits"
 
     max_image_size: int = 5 * 1024 * 1024
 
+    # Content-addressed image store (local filesystem backend); in
+    # production this must be a persistent volume (render.yaml mounts one)
+    image_storage_dir: str = "uploads"
+    # Set once image_storage_dir survives restarts and deploys; the data URL
+    # backfill refuses to run without it
+    image_storage_durable: bool = False
+    # Public prefix for image URLs in responses, e.g. the API's public origin
+    # plus /api/v1/images or a CDN; only the key-based path is stored
+    image_base_url: str = "/api/v1/images"
+    image_derivative_workers: int = 2
+    image_derivative_timeout: float = 5.0
+    # Seconds between sweeps for unreferenced images; 0 disables the sweep
+    image_gc_interval: int = 3600
+
+    # Response compression (br/zstd, falling back to gzip if they are missing)
+    compression_minimum_size: int = 1000
+    compression_cache_bytes: int = 16 * 1024 * 1024
+
+    # In-process cache budgets
+    cache_local_max_entries: int = 10_000
+    cache_local_max_bytes: int = 64 * 1024 * 1024
+    # With Redis, seconds an entry stays in process memory before re-reading it
+    cache_local_ttl: float = 2.0
+    # Seconds past expiry an entry may still be served while the database is
+    # unreachable
+    cache_stale_ttl: int = 900
+
     redis_url: Optional[str] = None
+    redis_pool_size: int = 20
+    # Seconds before a Redis call gives up and the local cache is used
+    redis_socket_timeout: float = 0.25
 
     class Config:
         env_file = ".env"
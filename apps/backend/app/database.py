@@ -1,19 +1,102 @@
+import asyncio
 import asyncpg
+import random
 import ssl as ssl_module
 import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
+from fastapi import Request
 from app.config import get_settings
+from app.utils.cache import cache
+from app.utils.serialization import dumps, loads
+from app.utils.vote_security import get_client_ip
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 pool = None
+# One pool per configured read replica
+read_pools: list = []
 
+# Methods whose handlers only read, and so may run on a replica
+READ_METHODS = {"GET", "HEAD"}
 
-def _get_ssl_context():
+_reconnect_task: Optional[asyncio.Task] = None
+
+# Failures that mean the database cannot be reached, as opposed to a bad query
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.InterfaceError,
+)
+# The subset that can interrupt a statement on a checked-out connection;
+# timeouts and interface misuse there are the query's fault, not an outage
+LOST_CONNECTION_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.AdminShutdownError,
+)
+
+
+class DatabaseUnavailableError(Exception):
+    """No connection to the database could be obtained."""
+
+
+class CircuitBreaker:
+    """Fails fast once the primary has failed repeatedly.
+
+    After `threshold` consecutive connection failures the circuit opens
+    and calls fail at once, without waiting on connect timeouts. Every
+    `reset_timeout` seconds one call is let through as a probe; its
+    success closes the circuit and its failure keeps it open.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self) -> None:
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            raise DatabaseUnavailableError("Database circuit open; failing fast")
+        # This call is the probe; others keep failing fast meanwhile
+        self.opened_at = now
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Database circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("Database circuit opened after repeated failures")
+            self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(
+    settings.database_breaker_threshold, settings.database_breaker_reset_timeout
+)
+
+
+def _get_ssl_context(database_url: Optional[str] = None):
     """Create SSL context for external database connections (e.g. Supabase)."""
-    if "localhost" in settings.database_url or "127.0.0.1" in settings.database_url:
+    database_url = database_url or settings.database_url
+    if "localhost" in database_url or "127.0.0.1" in database_url:
         return None
     ctx = ssl_module.create_default_context()
     ctx.check_hostname = False
@@ -21,48 +104,319 @@ def _get_ssl_context():
     return ctx
 
 
+def _encode_json(value) -> str:
+    return dumps(value).decode("utf-8")
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Register per-connection codecs.
+
+    json/jsonb columns come back as Python objects and take Python objects
+    as parameters; uuids come back as plain strings.
+    """
+    for typename in ("json", "jsonb"):
+        await conn.set_type_codec(
+            typename,
+            encoder=_encode_json,
+            decoder=loads,
+            schema="pg_catalog",
+        )
+    await conn.set_type_codec(
+        "uuid",
+        encoder=str,
+        decoder=str,
+        schema="pg_catalog",
+        format="text",
+    )
+
+
 async def init_db():
+    """Open the pools, or keep retrying in the background if that fails."""
+    global _reconnect_task
+    if await _create_pools():
+        return
+    logger.warning("App starting without DB — reconnecting in the background")
+    if _reconnect_task is None or _reconnect_task.done():
+        _reconnect_task = asyncio.create_task(_reconnect_loop())
+
+
+async def _create_pools() -> bool:
+    """Create the primary pool; it is published only once fully warmed up."""
     global pool
     try:
         ssl_ctx = _get_ssl_context()
-        pool = await asyncpg.create_pool(
+        # create_pool returns after min_size connections are open and
+        # initialised, so requests never wait on the first connects
+        new_pool = await asyncpg.create_pool(
             settings.database_url,
-            min_size=2,
+            min_size=settings.database_pool_min_size,
             max_size=settings.database_pool_size,
             command_timeout=30,
+            timeout=settings.database_connect_timeout,
             ssl=ssl_ctx,
+            init=_init_connection,
         )
-        logger.info("Database pool initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database pool: {e}")
-        logger.warning("App starting without DB — will retry on first request")
-        pool = None
+        return False
+
+    pool = new_pool
+    breaker.record_success()
+    logger.info("Database pool initialized successfully")
+
+    if settings.database_replica_urls and not read_pools:
+        await _init_read_pools()
+    return True
+
+
+async def _reconnect_loop():
+    """Retry pool creation with jittered exponential backoff."""
+    delay = 1.0
+    while pool is None:
+        await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+        if await _create_pools():
+            logger.info("Database connection restored")
+            return
+        delay = min(delay * 2, settings.database_reconnect_max_delay)
+
+
+async def _init_read_pools():
+    if cache.redis is None:
+        # The read-your-writes pin must be visible to every worker
+        logger.warning(
+            "Read replicas need REDIS_URL to keep read-your-writes across "
+            "workers; serving all reads from the primary"
+        )
+        return
+    for url in settings.database_replica_urls:
+        try:
+            read_pools.append(
+                await asyncpg.create_pool(
+                    url,
+                    min_size=1,
+                    max_size=settings.database_replica_pool_size,
+                    command_timeout=30,
+                    timeout=settings.database_connect_timeout,
+                    ssl=_get_ssl_context(url),
+                    init=_init_connection,
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Read replica unavailable, skipping it: {e}")
+    if read_pools:
+        logger.info(f"{len(read_pools)} read replica pool(s) initialized")
 
 
 async def close_db():
     global pool
+    if _reconnect_task:
+        _reconnect_task.cancel()
     if pool:
         await pool.close()
+    for read_pool in read_pools:
+        await read_pool.close()
+    read_pools.clear()
 
 
 async def _ensure_pool():
-    """Ensure pool is initialized, retry if it failed at startup."""
-    global pool
-    if pool is None:
+    """Fail fast while there is no pool.
+
+    Reconnecting is left to the background loop, so an outage does not
+    turn every request into a connection attempt. Outside the app's
+    lifespan (scripts), the first call opens the pool.
+    """
+    if pool is None and _reconnect_task is None:
         await init_db()
     if pool is None:
-        raise Exception("Database connection unavailable. Check DATABASE_URL and network access.")
+        raise DatabaseUnavailableError(
+            "Database connection unavailable. Check DATABASE_URL and network access."
+        )
+
 
+def is_ready() -> bool:
+    """Whether the primary pool is warmed up and its circuit is closed."""
+    return pool is not None and not breaker.is_open
 
-async def get_db() -> AsyncGenerator[asyncpg.Connection, None]:
+
+async def _checkout(target=None) -> asyncpg.Connection:
     await _ensure_pool()
-    async with pool.acquire() as conn:
+    target = target or pool
+    # Replica failures fall back to the primary and do not trip its breaker
+    primary = target is pool
+    if primary:
+        breaker.before_call()
+    try:
+        conn = await target.acquire()
+    except CONNECTION_ERRORS as e:
+        if primary:
+            breaker.record_failure()
+        raise DatabaseUnavailableError(f"Could not acquire a connection: {e}") from e
+    if primary:
+        breaker.record_success()
+    return conn
+
+
+async def pin_to_primary(client: str) -> None:
+    """Send this client's reads to the primary until replicas catch up.
+
+    The pin lives in Redis, so a read served by any worker honours it;
+    replicas are only used when Redis is configured.
+    """
+    try:
+        await cache.redis.set(
+            f"primary:{client}", 1, ex=settings.database_read_your_writes_window
+        )
+    except Exception as e:
+        logger.warning(f"Could not pin client to the primary: {e}")
+
+
+async def is_pinned_to_primary(client: str) -> bool:
+    try:
+        return bool(await cache.redis.exists(f"primary:{client}"))
+    except Exception:
+        # Unknown, so take the read that is always fresh
+        return True
+
+
+@asynccontextmanager
+async def _acquire():
+    conn = await _checkout()
+    try:
         yield conn
+    finally:
+        await pool.release(conn)
+
+
+class LazyConnection:
+    """Connection handle that holds a pool connection only while querying.
+
+    Nothing is checked out until the first statement runs. Once a
+    statement finishes, the connection goes back to the pool unless
+    another one starts before the handler next yields to the event loop,
+    so back-to-back queries share a connection while cache lookups,
+    serialisation and sending the response hold none. Inside
+    `transaction()` the connection is pinned until the block ends.
+
+    A `read_only` handle checks out from a random replica when there are
+    any, unless `client` wrote recently; a replica that cannot be reached
+    falls back to the primary.
+    """
+
+    def __init__(self, read_only: bool = False, client: Optional[str] = None):
+        self.read_only = read_only
+        self.client = client
+        self._conn: Optional[asyncpg.Connection] = None
+        self._pool = None
+        self._busy = 0
+        self._pins = 0
+        self._releases: set[asyncio.Task] = set()
+
+    async def _connection(self) -> asyncpg.Connection:
+        if self._conn is None:
+            target = await self._choose_pool()
+            try:
+                self._conn = await _checkout(target)
+            except DatabaseUnavailableError as e:
+                if target is pool:
+                    raise
+                logger.warning(f"Read replica unavailable, using the primary: {e}")
+                target = pool
+                self._conn = await _checkout(target)
+            self._pool = target
+        return self._conn
+
+    async def _choose_pool(self):
+        await _ensure_pool()
+        if not (self.read_only and read_pools):
+            return pool
+        if self.client and await is_pinned_to_primary(self.client):
+            return pool
+        return random.choice(read_pools)
+
+    async def _run(self, method: str, *args, **kwargs):
+        self._busy += 1
+        try:
+            conn = await self._connection()
+            try:
+                return await getattr(conn, method)(*args, **kwargs)
+            except LOST_CONNECTION_ERRORS as e:
+                if self._pool is pool:
+                    breaker.record_failure()
+                raise DatabaseUnavailableError(f"Connection lost: {e}") from e
+        finally:
+            self._busy -= 1
+            self._release_soon()
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._run("fetch", query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._run("fetchrow", query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._run("fetchval", query, *args, **kwargs)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._run("execute", query, *args, **kwargs)
+
+    async def executemany(self, command: str, args, **kwargs):
+        return await self._run("executemany", command, args, **kwargs)
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        self._pins += 1
+        try:
+            conn = await self._connection()
+            async with conn.transaction(**kwargs):
+                yield
+        finally:
+            self._pins -= 1
+            self._release_soon()
+
+    def _release_soon(self) -> None:
+        # Runs after the current task step, by which time a handler issuing
+        # its next query has already marked the handle busy again
+        asyncio.get_running_loop().call_soon(self._release_if_idle)
+
+    def _release_if_idle(self) -> None:
+        if self._conn is None or self._busy or self._pins:
+            return
+        conn, self._conn = self._conn, None
+        task = asyncio.ensure_future(self._pool.release(conn))
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await self._pool.release(conn)
+        if self._releases:
+            await asyncio.gather(*self._releases, return_exceptions=True)
+
+
+async def get_db(request: Request) -> AsyncGenerator[LazyConnection, None]:
+    """Per-request connection handle; GET requests may read from a replica."""
+    client = None
+    if read_pools:
+        client = request.headers.get("X-Browser-ID") or get_client_ip(request)
+        if request.method not in READ_METHODS:
+            # Pinned before the write, so no read can race ahead of it
+            await pin_to_primary(client)
+
+    db = LazyConnection(read_only=request.method in READ_METHODS, client=client)
+    try:
+        yield db
+    finally:
+        await db.close()
 
 
 @asynccontextmanager
 async def get_db_connection():
-    await _ensure_pool()
-    async with pool.acquire() as conn:
-        yield conn
+    """A primary connection for work outside a request.
 
+    Values that will be cached are read here too: a lagging replica would
+    otherwise put a value back into the cache just after it was
+    invalidated, and keep it there for a whole TTL.
+    """
+    async with _acquire() as conn:
+        yield conn
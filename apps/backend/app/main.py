@@ -1,24 +1,37 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-import time
-from collections import defaultdict
+import asyncio
+import math
 
 from app.config import get_settings
-from app.database import init_db, close_db
-from app.routes import posts, votes, upload, reports, admin, comments
+from app.database import init_db, close_db, is_ready, DatabaseUnavailableError
+from app.utils.image_derivatives import shutdown_executor
+from app.utils.image_registry import image_gc_loop
+from app.utils.serialization import FastJSONResponse
+from app.utils.compression import CompressionMiddleware
+from app.utils.cache import cache
+from app.utils.rate_limit import create_rate_limiter, match_policy
+from app.routes import posts, votes, upload, reports, admin, comments, images
 
 settings = get_settings()
 
-rate_limits = defaultdict(list)
+rate_limiter = create_rate_limiter()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await cache.start_listener()
+    gc_task = None
+    if settings.image_gc_interval > 0:
+        gc_task = asyncio.create_task(image_gc_loop(settings.image_gc_interval))
     yield
+    if gc_task:
+        gc_task.cancel()
+    shutdown_executor()
+    await rate_limiter.close()
+    await cache.close()
     await close_db()
 
 
@@ -26,9 +39,14 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    cache_bytes=settings.compression_cache_bytes,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,41 +58,49 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailableError):
+    return FastJSONResponse(
+        status_code=503,
+        content={
+            "success": False,
+            "error": "DATABASE_UNAVAILABLE",
+            "message": "Service temporarily unavailable. Try again shortly.",
+        },
+        headers={"Retry-After": str(math.ceil(settings.database_breaker_reset_timeout))},
+    )
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     if request.method == "OPTIONS":
         return await call_next(request)
 
+    policy = match_policy(
+        request.method,
+        request.url.path,
+        request.query_params,
+        settings.rate_limit_policies,
+    )
+    if policy.cost == 0:
+        return await call_next(request)
+
     client_ip = get_client_ip(request)
-    now = time.time()
-
-    rate_limits[client_ip] = [
-        t for t in rate_limits[client_ip] if now - t < settings.rate_limit_window
-    ]
-
-    if request.method == "POST":
-        if len(rate_limits[client_ip]) >= 20:
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "success": False,
-                    "error": "RATE_LIMIT",
-                    "message": "Too many requests. Try again later.",
-                },
-            )
-
-    if len(rate_limits[client_ip]) >= settings.rate_limit_requests:
-        return JSONResponse(
+    limit = policy.limit or settings.rate_limit_requests
+
+    if not await rate_limiter.hit(f"{policy.bucket}:{client_ip}", limit, policy.cost):
+        return FastJSONResponse(
             status_code=429,
             content={
                 "success": False,
                 "error": "RATE_LIMIT",
-                "message": "Rate limit exceeded",
+                "message": "Rate limit exceeded"
+                if policy.bucket == "default"
+                else "Too many requests. Try again later.",
             },
+            headers={"Retry-After": str(settings.rate_limit_window)},
         )
 
-    rate_limits[client_ip].append(now)
-
     return await call_next(request)
 
 
@@ -94,6 +120,7 @@ app.include_router(posts.router, prefix="/api/v1")
 app.include_router(votes.router, prefix="/api/v1")
 app.include_router(comments.router, prefix="/api/v1")
 app.include_router(upload.router, prefix="/api/v1")
+app.include_router(images.router, prefix="/api/v1")
 app.include_router(reports.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1")
 
@@ -101,3 +128,14 @@ app.include_router(admin.router, prefix="/api/v1")
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "version": settings.app_version}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Ready once the database pool is warmed up and reachable."""
+    if not is_ready():
+        return FastJSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "version": settings.app_version},
+        )
+    return {"status": "ready", "version": settings.app_version}
@@ -6,9 +6,12 @@ import json
 
 from app.database import get_db
 from app.config import get_settings
-from app.utils import get_client_ip, invalidate_post_cache
+from app.utils import get_client_ip, canonical_uuid, invalidate_post_cache
+from app.utils.image_derivatives import derivative_urls
+from app.utils.image_store import public_image_url
+from app.utils.serialization import FastJSONRoute
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=FastJSONRoute)
 
 
 async def verify_admin(request: Request, db=Depends(get_db)):
@@ -153,13 +156,13 @@ async def get_reported_posts(
         "data": {
             "posts": [
                 {
-                    "id": str(post["id"]),
+                    "id": post["id"],
                     "type": post["type"],
                     "caption": post["caption"],
                     "vote_count": post["vote_count"],
                     "report_count": post["report_count"],
                     "item_count": post["item_count"],
-                    "created_at": post["created_at"].isoformat(),
+                    "created_at": post["created_at"],
                 }
                 for post in posts
             ],
@@ -217,9 +220,10 @@ async def get_all_posts(
 
         items_data = [
             {
-                "id": str(item["id"]),
+                "id": item["id"],
                 "name": item["name"],
-                "image_url": item["image_url"],
+                "image_url": public_image_url(item["image_url"]),
+                "variants": derivative_urls(item["image_url"]),
                 "vote_count": item["vote_count"],
             }
             for item in items
@@ -227,7 +231,7 @@ async def get_all_posts(
 
         result_posts.append(
             {
-                "id": str(post_id),
+                "id": post_id,
                 "type": post["type"],
                 "caption": post["caption"],
                 "items": items_data,
@@ -235,8 +239,8 @@ async def get_all_posts(
                 "comment_count": post["comment_count"],
                 "report_count": post["report_count"],
                 "is_removed": post["is_removed"],
-                "expires_at": post["expires_at"].isoformat() if post["expires_at"] else None,
-                "created_at": post["created_at"].isoformat(),
+                "expires_at": post["expires_at"],
+                "created_at": post["created_at"],
             }
         )
 
@@ -257,6 +261,7 @@ async def get_all_posts(
 @router.delete("/posts/{post_id}")
 async def admin_delete_post(post_id: str, request: Request, db=Depends(get_db)):
     """Admin delete any post (bypasses creator token check)."""
+    post_id = canonical_uuid(post_id, "Post not found")
     browser_id = request.headers.get("X-Browser-ID")
     if not browser_id:
         raise HTTPException(status_code=401, detail="Admin authentication required")
@@ -273,13 +278,14 @@ async def admin_delete_post(post_id: str, request: Request, db=Depends(get_db)):
     if result == "UPDATE 0":
         raise HTTPException(status_code=404, detail="Post not found")
 
-    invalidate_post_cache(post_id)
+    await invalidate_post_cache(post_id)
 
     return {"success": True, "message": "Post removed by admin"}
 
 
 @router.post("/posts/{post_id}/approve")
 async def approve_post(post_id: str, db=Depends(get_db)):
+    post_id = canonical_uuid(post_id, "Post not found")
     result = await db.execute(
         """
         UPDATE posts
@@ -297,6 +303,7 @@ async def approve_post(post_id: str, db=Depends(get_db)):
 
 @router.post("/posts/{post_id}/remove")
 async def remove_post(post_id: str, db=Depends(get_db)):
+    post_id = canonical_uuid(post_id, "Post not found")
     result = await db.execute(
         """
         UPDATE posts
@@ -309,6 +316,8 @@ async def remove_post(post_id: str, db=Depends(get_db)):
     if result == "UPDATE 0":
         raise HTTPException(status_code=404, detail="Post not found")
 
+    await invalidate_post_cache(post_id)
+
     return {"success": True, "message": "Post removed"}
 
 
@@ -343,10 +352,10 @@ async def get_daily_analytics(
         "success": True,
         "data": {
             "posts": [
-                {"date": str(row["date"]), "count": row["count"]} for row in posts_data
+                {"date": row["date"], "count": row["count"]} for row in posts_data
             ],
             "votes": [
-                {"date": str(row["date"]), "count": row["count"]} for row in votes_data
+                {"date": row["date"], "count": row["count"]} for row in votes_data
             ],
         },
     }
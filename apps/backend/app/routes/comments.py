@@ -2,12 +2,24 @@ from fastapi import APIRouter, Request, HTTPException, Depends, Query
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_db, get_db_connection
 from app.schemas import CommentCreate, CommentEdit, ReactionRequest
-from app.utils import get_client_ip, generate_ip_hash, sanitize_text
-from app.utils.name_generator import get_or_create_display_name
-
-router = APIRouter(tags=["comments"])
+from app.utils import (
+    get_client_ip,
+    canonical_uuid,
+    generate_ip_hash,
+    sanitize_text,
+    cache_key_comments,
+    get_cached_comments,
+    set_cached_comments,
+    invalidate_comment_thread,
+    invalidate_post_counts,
+    COMMENT_CACHE_PAGES,
+)
+from app.utils.name_generator import create_display_name
+from app.utils.serialization import FastJSONRoute
+
+router = APIRouter(tags=["comments"], route_class=FastJSONRoute)
 
 EDIT_WINDOW_MINUTES = 15
 
@@ -21,10 +33,87 @@ async def get_comments(
     limit: int = Query(20, ge=1, le=50),
     db=Depends(get_db),
 ):
+    # Cache keys must match the ids used by write-side invalidation
+    post_id = canonical_uuid(post_id, "Post not found")
+    if parent_id:
+        parent_id = canonical_uuid(parent_id, "Parent comment not found")
+
     client_ip = get_client_ip(request)
     ip_hash = generate_ip_hash(client_ip, post_id)
     offset = (page - 1) * limit
 
+    # The key is resolved before loading, so a write that lands meanwhile
+    # moves the generation on and the page is never cached under it
+    cache_key = None
+    comments_page = None
+    if page <= COMMENT_CACHE_PAGES:
+        cache_key = await cache_key_comments(post_id, parent_id, page, limit)
+        comments_page = await get_cached_comments(cache_key)
+    if comments_page is None and cache_key:
+        # Pages bound for the cache are read from the primary
+        async with get_db_connection() as conn:
+            comments_page = await fetch_comments_page(
+                post_id, parent_id, limit, offset, conn
+            )
+        await set_cached_comments(cache_key, comments_page)
+    elif comments_page is None:
+        comments_page = await fetch_comments_page(post_id, parent_id, limit, offset, db)
+
+    comments = comments_page["comments"]
+    total = comments_page["total"]
+
+    # Per-viewer fields are never cached; overlay them with one small lookup
+    user_reaction_map = {}
+    if comments:
+        user_reactions = await db.fetch(
+            """
+            SELECT comment_id, reaction_type
+            FROM comment_reactions
+            WHERE comment_id = ANY($1::uuid[]) AND ip_hash = $2
+            """,
+            [c["id"] for c in comments],
+            ip_hash,
+        )
+        user_reaction_map = {r["comment_id"]: r["reaction_type"] for r in user_reactions}
+
+    now = datetime.now(timezone.utc)
+    result_comments = []
+    for comment in comments:
+        comment = dict(comment)
+        author_hash = comment.pop("ip_hash")
+        can_edit = False
+        if author_hash == ip_hash:
+            edit_deadline = datetime.fromisoformat(comment["created_at"]) + timedelta(
+                minutes=EDIT_WINDOW_MINUTES
+            )
+            can_edit = now < edit_deadline
+
+        comment["user_reaction"] = user_reaction_map.get(comment["id"], None)
+        comment["can_edit"] = can_edit
+        result_comments.append(comment)
+
+    return {
+        "success": True,
+        "data": {
+            "comments": result_comments,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "has_more": offset + len(comments) < total,
+            },
+        },
+    }
+
+
+async def fetch_comments_page(
+    post_id: str, parent_id: Optional[str], limit: int, offset: int, db
+) -> dict:
+    """Load the viewer-independent part of a comments page.
+
+    The author's ip_hash is kept so `can_edit` can be derived per viewer;
+    get_comments strips it before responding.
+    """
     post = await db.fetchrow(
         "SELECT id FROM posts WHERE id = $1 AND is_removed = FALSE", post_id
     )
@@ -68,8 +157,8 @@ async def get_comments(
         parent_id,
     )
 
-    # Batch: get all reactions, reply counts, and user reactions in fewer queries
-    comment_ids = [str(c["id"]) for c in comments]
+    # Batch: get all reactions and reply counts in fewer queries
+    comment_ids = [c["id"] for c in comments]
 
     if comment_ids:
         # Batch reactions
@@ -84,9 +173,9 @@ async def get_comments(
         )
         reactions_map: dict = {}
         for r in all_reactions:
-            cid = str(r["comment_id"])
+            cid = r["comment_id"]
             if cid not in reactions_map:
-                reactions_map[cid] = {"like": 0, "love": 0, "laugh": 0, "wow": 0, "sad": 0, "fire": 0}
+                reactions_map[cid] = merge_reaction_counts(None)
             reactions_map[cid][r["reaction_type"]] = r["count"]
 
         # Batch reply counts
@@ -99,56 +188,28 @@ async def get_comments(
             """,
             comment_ids,
         )
-        reply_count_map = {str(r["parent_id"]): r["count"] for r in reply_counts}
-
-        # Batch user reactions
-        user_reactions = await db.fetch(
-            """
-            SELECT comment_id, reaction_type
-            FROM comment_reactions
-            WHERE comment_id = ANY($1::uuid[]) AND ip_hash = $2
-            """,
-            comment_ids,
-            ip_hash,
-        )
-        user_reaction_map = {str(r["comment_id"]): r["reaction_type"] for r in user_reactions}
+        reply_count_map = {r["parent_id"]: r["count"] for r in reply_counts}
     else:
         reactions_map = {}
         reply_count_map = {}
-        user_reaction_map = {}
-
-    result_comments = []
-    for comment in comments:
-        cid = str(comment["id"])
-        can_edit = False
-        if comment["ip_hash"] == ip_hash:
-            edit_deadline = comment["created_at"] + timedelta(minutes=EDIT_WINDOW_MINUTES)
-            can_edit = datetime.now(timezone.utc) < edit_deadline
-
-        result_comments.append({
-            "id": cid,
-            "content": comment["content"],
-            "display_name": comment["display_name"],
-            "parent_id": str(comment["parent_id"]) if comment["parent_id"] else None,
-            "is_edited": comment["is_edited"],
-            "replies_count": reply_count_map.get(cid, 0),
-            "reactions": reactions_map.get(cid, {"like": 0, "love": 0, "laugh": 0, "wow": 0, "sad": 0, "fire": 0}),
-            "user_reaction": user_reaction_map.get(cid, None),
-            "can_edit": can_edit,
-            "created_at": comment["created_at"].isoformat(),
-        })
 
+    # Kept JSON-safe: this dict is what the comment cache stores
     return {
-        "success": True,
-        "data": {
-            "comments": result_comments,
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "has_more": offset + len(comments) < total,
-            },
-        },
+        "comments": [
+            {
+                "id": comment["id"],
+                "content": comment["content"],
+                "display_name": comment["display_name"],
+                "parent_id": comment["parent_id"],
+                "is_edited": comment["is_edited"],
+                "replies_count": reply_count_map.get(comment["id"], 0),
+                "reactions": reactions_map.get(comment["id"], merge_reaction_counts(None)),
+                "created_at": comment["created_at"].isoformat(),
+                "ip_hash": comment["ip_hash"],
+            }
+            for comment in comments
+        ],
+        "total": total,
     }
 
 
@@ -159,34 +220,56 @@ async def create_comment(
     request: Request,
     db=Depends(get_db),
 ):
+    post_id = canonical_uuid(post_id, "Post not found")
     client_ip = get_client_ip(request)
     ip_hash = generate_ip_hash(client_ip, post_id)
     browser_id = request.headers.get("X-Browser-ID")
 
-    post = await db.fetchrow(
-        "SELECT id FROM posts WHERE id = $1 AND is_removed = FALSE", post_id
+    context = await db.fetchrow(
+        """
+        SELECT
+            EXISTS (
+                SELECT 1 FROM posts WHERE id = $1 AND is_removed = FALSE
+            ) AS post_exists,
+            (
+                $3::uuid IS NULL OR EXISTS (
+                    SELECT 1 FROM comments
+                    WHERE id = $3 AND post_id = $1 AND is_removed = FALSE
+                )
+            ) AS parent_exists,
+            (SELECT parent_id FROM comments WHERE id = $3) AS grandparent_id,
+            (
+                SELECT display_name FROM commenters
+                WHERE post_id = $1 AND ip_hash = $2
+            ) AS display_name
+        """,
+        post_id,
+        ip_hash,
+        comment_data.parent_id,
     )
-    if not post:
+    if not context["post_exists"]:
         raise HTTPException(status_code=404, detail="Post not found")
+    if not context["parent_exists"]:
+        raise HTTPException(status_code=404, detail="Parent comment not found")
 
-    if comment_data.parent_id:
-        parent = await db.fetchrow(
-            "SELECT id FROM comments WHERE id = $1 AND post_id = $2 AND is_removed = FALSE",
-            comment_data.parent_id,
-            post_id,
-        )
-        if not parent:
-            raise HTTPException(status_code=404, detail="Parent comment not found")
-
-    display_name = await get_or_create_display_name(ip_hash, post_id, db)
+    display_name = context["display_name"] or await create_display_name(
+        ip_hash, post_id, db
+    )
 
     content = sanitize_text(comment_data.content)
 
-    comment_id = await db.fetchval(
+    comment = await db.fetchrow(
         """
-        INSERT INTO comments (post_id, parent_id, content, ip_hash, browser_id, display_name)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id
+        WITH inserted AS (
+            INSERT INTO comments (post_id, parent_id, content, ip_hash, browser_id, display_name)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            RETURNING id, post_id, content, display_name, parent_id, is_edited,
+                      created_at, updated_at, ip_hash
+        ),
+        bumped AS (
+            UPDATE posts SET comment_count = comment_count + 1 WHERE id = $1
+        )
+        SELECT * FROM inserted
         """,
         post_id,
         comment_data.parent_id,
@@ -196,21 +279,16 @@ async def create_comment(
         display_name,
     )
 
-    await db.execute(
-        "UPDATE posts SET comment_count = comment_count + 1 WHERE id = $1", post_id
-    )
-
-    comment = await db.fetchrow(
-        """
-        SELECT id, content, display_name, parent_id, is_edited, created_at, updated_at, ip_hash
-        FROM comments WHERE id = $1
-        """,
-        comment_id,
+    await invalidate_comment_threads(
+        comment["post_id"], comment["parent_id"], context["grandparent_id"]
     )
+    # The cached post carries comment_count
+    await invalidate_post_counts(comment["post_id"])
 
+    # A brand-new comment has no reactions or replies yet
     return {
         "success": True,
-        "data": await build_comment_data(comment, ip_hash, db),
+        "data": serialize_comment(comment, ip_hash, merge_reaction_counts(None), 0, None),
     }
 
 
@@ -236,7 +314,7 @@ async def edit_comment(
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    ip_hash = generate_ip_hash(client_ip, str(comment["post_id"]))
+    ip_hash = generate_ip_hash(client_ip, comment["post_id"])
 
     if comment["ip_hash"] != ip_hash:
         raise HTTPException(
@@ -252,26 +330,46 @@ async def edit_comment(
 
     content = sanitize_text(edit_data.content)
 
-    await db.execute(
+    updated_comment = await db.fetchrow(
         """
-        UPDATE comments SET content = $1, is_edited = TRUE, updated_at = NOW()
-        WHERE id = $2
+        UPDATE comments c SET content = $1, is_edited = TRUE, updated_at = NOW()
+        WHERE c.id = $2
+        RETURNING c.id, c.content, c.display_name, c.parent_id, c.is_edited,
+                  c.created_at, c.updated_at, c.ip_hash,
+                  (
+                      SELECT json_object_agg(reaction_type, count) FROM (
+                          SELECT reaction_type, COUNT(*)::int AS count
+                          FROM comment_reactions
+                          WHERE comment_id = c.id
+                          GROUP BY reaction_type
+                      ) r
+                  ) AS reactions,
+                  (
+                      SELECT COUNT(*) FROM comments
+                      WHERE parent_id = c.id AND is_removed = FALSE
+                  ) AS replies_count,
+                  (
+                      SELECT reaction_type FROM comment_reactions
+                      WHERE comment_id = c.id AND ip_hash = $3
+                  ) AS user_reaction
         """,
         content,
         comment_id,
+        ip_hash,
     )
 
-    updated_comment = await db.fetchrow(
-        """
-        SELECT id, content, display_name, parent_id, is_edited, created_at, updated_at, ip_hash
-        FROM comments WHERE id = $1
-        """,
-        comment_id,
-    )
+    # Only the comment's own listing changes; replies_count upstream does not
+    await invalidate_comment_thread(comment["post_id"], comment["parent_id"])
 
     return {
         "success": True,
-        "data": await build_comment_data(updated_comment, ip_hash, db),
+        "data": serialize_comment(
+            updated_comment,
+            ip_hash,
+            merge_reaction_counts(updated_comment["reactions"]),
+            updated_comment["replies_count"],
+            updated_comment["user_reaction"],
+        ),
     }
 
 
@@ -285,7 +383,8 @@ async def delete_comment(
 
     comment = await db.fetchrow(
         """
-        SELECT c.id, c.post_id, c.ip_hash
+        SELECT c.id, c.post_id, c.ip_hash, c.parent_id,
+               (SELECT p.parent_id FROM comments p WHERE p.id = c.parent_id) AS grandparent_id
         FROM comments c
         WHERE c.id = $1 AND c.is_removed = FALSE
         """,
@@ -295,7 +394,7 @@ async def delete_comment(
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    ip_hash = generate_ip_hash(client_ip, str(comment["post_id"]))
+    ip_hash = generate_ip_hash(client_ip, comment["post_id"])
 
     if comment["ip_hash"] != ip_hash:
         raise HTTPException(
@@ -309,6 +408,11 @@ async def delete_comment(
         comment["post_id"],
     )
 
+    await invalidate_comment_threads(
+        comment["post_id"], comment["parent_id"], comment["grandparent_id"]
+    )
+    await invalidate_post_counts(comment["post_id"])
+
     return {"success": True, "message": "Comment deleted"}
 
 
@@ -324,7 +428,7 @@ async def add_reaction(
 
     comment = await db.fetchrow(
         """
-        SELECT c.id, c.post_id FROM comments c
+        SELECT c.id, c.post_id, c.parent_id FROM comments c
         WHERE c.id = $1 AND c.is_removed = FALSE
         """,
         comment_id,
@@ -333,54 +437,14 @@ async def add_reaction(
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    ip_hash = generate_ip_hash(client_ip, str(comment["post_id"]))
+    ip_hash = generate_ip_hash(client_ip, comment["post_id"])
 
-    existing = await db.fetchrow(
-        """
-        SELECT id, reaction_type FROM comment_reactions
-        WHERE comment_id = $1 AND ip_hash = $2
-        """,
-        comment_id,
-        ip_hash,
+    reactions, user_reaction = await toggle_reaction(
+        comment_id, ip_hash, browser_id, reaction_data.reaction_type, db
     )
 
-    if existing:
-        if existing["reaction_type"] == reaction_data.reaction_type:
-            await db.execute(
-                "DELETE FROM comment_reactions WHERE id = $1", existing["id"]
-            )
-        else:
-            await db.execute(
-                """
-                UPDATE comment_reactions 
-                SET reaction_type = $1, created_at = NOW()
-                WHERE id = $2
-                """,
-                reaction_data.reaction_type,
-                existing["id"],
-            )
-    else:
-        await db.execute(
-            """
-            INSERT INTO comment_reactions (comment_id, ip_hash, browser_id, reaction_type)
-            VALUES ($1, $2, $3, $4)
-            """,
-            comment_id,
-            ip_hash,
-            browser_id,
-            reaction_data.reaction_type,
-        )
-
-    reactions = await get_comment_reactions(comment_id, db)
-
-    user_reaction = await db.fetchval(
-        """
-        SELECT reaction_type FROM comment_reactions
-        WHERE comment_id = $1 AND ip_hash = $2
-        """,
-        comment_id,
-        ip_hash,
-    )
+    # Only the comment's own listing changes; replies_count upstream does not
+    await invalidate_comment_thread(comment["post_id"], comment["parent_id"])
 
     return {
         "success": True,
@@ -400,13 +464,14 @@ async def remove_reaction(
     client_ip = get_client_ip(request)
 
     comment = await db.fetchrow(
-        "SELECT c.id, c.post_id FROM comments c WHERE c.id = $1", comment_id
+        "SELECT c.id, c.post_id, c.parent_id FROM comments c WHERE c.id = $1",
+        comment_id,
     )
 
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    ip_hash = generate_ip_hash(client_ip, str(comment["post_id"]))
+    ip_hash = generate_ip_hash(client_ip, comment["post_id"])
 
     await db.execute(
         "DELETE FROM comment_reactions WHERE comment_id = $1 AND ip_hash = $2",
@@ -414,20 +479,26 @@ async def remove_reaction(
         ip_hash,
     )
 
+    # Only the comment's own listing changes; replies_count upstream does not
+    await invalidate_comment_thread(comment["post_id"], comment["parent_id"])
+
     return {"success": True, "message": "Reaction removed"}
 
 
-async def get_comment_reactions(comment_id: str, db) -> dict:
-    reactions = await db.fetch(
-        """
-        SELECT reaction_type, COUNT(*) as count
-        FROM comment_reactions
-        WHERE comment_id = $1
-        GROUP BY reaction_type
-        """,
-        comment_id,
-    )
+async def invalidate_comment_threads(post_id, parent_id, grandparent_id) -> None:
+    """Drop cached pages of the thread a comment is added to or removed from.
+
+    When the comment is a reply, the page listing its parent is dropped too,
+    since that page carries the parent's replies_count. Edits and reactions
+    leave replies_count alone and only drop the comment's own thread.
+    """
+    await invalidate_comment_thread(post_id, parent_id)
+    if parent_id:
+        await invalidate_comment_thread(post_id, grandparent_id)
 
+
+def merge_reaction_counts(counts) -> dict:
+    """Fill in zero counts for reaction types nobody has used yet."""
     return {
         "like": 0,
         "love": 0,
@@ -435,47 +506,90 @@ async def get_comment_reactions(comment_id: str, db) -> dict:
         "wow": 0,
         "sad": 0,
         "fire": 0,
-        **{r["reaction_type"]: r["count"] for r in reactions},
+        **(counts or {}),
     }
 
 
-async def get_replies_count(comment_id: str, db) -> int:
-    return await db.fetchval(
+async def toggle_reaction(
+    comment_id: str, ip_hash: str, browser_id: Optional[str], reaction_type: str, db
+) -> tuple[dict, Optional[str]]:
+    """Toggle, switch or add the caller's reaction in a single statement.
+
+    All parts of a writable CTE share one snapshot, so the counts are built
+    from the pre-write rows plus the +1/-1 deltas each branch returns.
+    """
+    row = await db.fetchrow(
         """
-        SELECT COUNT(*) FROM comments
-        WHERE parent_id = $1 AND is_removed = FALSE
+        WITH existing AS (
+            SELECT id, reaction_type FROM comment_reactions
+            WHERE comment_id = $1 AND ip_hash = $2
+        ),
+        removed AS (
+            DELETE FROM comment_reactions r
+            USING existing e
+            WHERE r.id = e.id AND e.reaction_type = $3
+            RETURNING r.reaction_type
+        ),
+        switched AS (
+            UPDATE comment_reactions r
+            SET reaction_type = $3, created_at = NOW()
+            FROM existing e
+            WHERE r.id = e.id AND e.reaction_type <> $3
+            RETURNING e.reaction_type AS old_type, r.reaction_type AS new_type
+        ),
+        inserted AS (
+            INSERT INTO comment_reactions (comment_id, ip_hash, browser_id, reaction_type)
+            SELECT $1, $2, $4, $3
+            WHERE NOT EXISTS (SELECT 1 FROM existing)
+            RETURNING reaction_type
+        ),
+        deltas AS (
+            SELECT reaction_type, 1 AS delta FROM comment_reactions WHERE comment_id = $1
+            UNION ALL SELECT reaction_type, -1 FROM removed
+            UNION ALL SELECT old_type, -1 FROM switched
+            UNION ALL SELECT new_type, 1 FROM switched
+            UNION ALL SELECT reaction_type, 1 FROM inserted
+        ),
+        counts AS (
+            SELECT reaction_type, SUM(delta)::int AS count
+            FROM deltas
+            GROUP BY reaction_type
+        )
+        SELECT
+            (SELECT json_object_agg(reaction_type, count) FROM counts) AS reactions,
+            (
+                SELECT new_type FROM switched
+                UNION ALL
+                SELECT reaction_type FROM inserted
+                LIMIT 1
+            ) AS user_reaction
         """,
         comment_id,
+        ip_hash,
+        reaction_type,
+        browser_id,
     )
 
+    return merge_reaction_counts(row["reactions"]), row["user_reaction"]
 
-async def build_comment_data(comment, ip_hash: str, db) -> dict:
-    reactions = await get_comment_reactions(comment["id"], db)
-    replies_count = await get_replies_count(comment["id"], db)
-
-    user_reaction = await db.fetchval(
-        """
-        SELECT reaction_type FROM comment_reactions
-        WHERE comment_id = $1 AND ip_hash = $2
-        """,
-        comment["id"],
-        ip_hash,
-    )
 
+def serialize_comment(
+    comment, ip_hash: str, reactions: dict, replies_count: int, user_reaction: Optional[str]
+) -> dict:
     can_edit = False
     if comment["ip_hash"] == ip_hash:
         edit_deadline = comment["created_at"] + timedelta(minutes=EDIT_WINDOW_MINUTES)
         can_edit = datetime.now(timezone.utc) < edit_deadline
 
     return {
-        "id": str(comment["id"]),
+        "id": comment["id"],
         "content": comment["content"],
         "display_name": comment["display_name"],
-        "parent_id": str(comment["parent_id"]) if comment["parent_id"] else None,
+        "parent_id": comment["parent_id"],
         "is_edited": comment["is_edited"],
         "replies_count": replies_count,
         "reactions": reactions,
         "user_reaction": user_reaction,
         "can_edit": can_edit,
-        "created_at": comment["created_at"].isoformat(),
+        "created_at": comment["created_at"],
     }
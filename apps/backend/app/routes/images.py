@@ -0,0 +1,65 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from app.utils.image_store import image_store, IMAGE_KEY_RE, CONTENT_TYPES_BY_EXTENSION
+from app.utils.file_response import (
+    FileRangeResponse,
+    ByteRangeNotSatisfiable,
+    IMMUTABLE_CACHE_CONTROL,
+    etag_matches,
+    parse_byte_range,
+)
+
+router = APIRouter(tags=["images"])
+
+
+@router.api_route("/images/{key}", methods=["GET", "HEAD"])
+async def get_image(key: str, request: Request):
+    """
+    Serve an image from the content-addressed store.
+
+    Keys are content hashes, so a key's bytes never change: the ETag is the
+    key itself and responses are cacheable forever.
+    """
+    match = IMAGE_KEY_RE.match(key)
+    if not match:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path = image_store.path_for(key)
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{key}"'
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+        # Served bytes are only ever images; never let browsers guess otherwise
+        "x-content-type-options": "nosniff",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_byte_range(request.headers.get("range"), size)
+        except ByteRangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "content-range": f"bytes */{size}"},
+            )
+
+    return FileRangeResponse(
+        path,
+        size,
+        media_type=CONTENT_TYPES_BY_EXTENSION[match.group(3)],
+        headers=headers,
+        byte_range=byte_range,
+    )
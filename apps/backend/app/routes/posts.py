@@ -1,22 +1,78 @@
 from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, timezone
-import json
+import io
+from typing import Optional
 
-from app.database import get_db
+from app.config import get_settings
+from app.database import get_db, get_db_connection, DatabaseUnavailableError
 from app.schemas import PostCreate
 from app.utils import (
     get_client_ip,
+    canonical_uuid,
     generate_ip_hash,
     generate_creator_token,
     sanitize_text,
+    cache,
+    cache_key_feed,
+    cache_key_post,
     invalidate_post_cache,
+    invalidate_feed_cache,
+    FEED_CACHE_TTL,
+    POST_CACHE_TTL,
+    STALE_HEADER,
 )
 from app.utils.trending import get_trending_order_clause
+from app.utils.fields import FieldSelection, row_values
+from app.utils.image_derivatives import create_derivatives, derivative_urls
+from app.utils.image_registry import store_image, set_image_dimensions
+from app.utils.image_store import (
+    image_key_from_url,
+    image_path_for,
+    public_image_url,
+    is_data_url,
+    read_data_url,
+    ImageTooLargeError,
+)
+from app.utils.serialization import FastJSONResponse, FastJSONRoute
 
-router = APIRouter(tags=["posts"])
+router = APIRouter(tags=["posts"], route_class=FastJSONRoute)
+settings = get_settings()
 
 VALID_POST_TYPES = ["poll", "wyr", "rate", "rank", "compare"]
 
+# Fields selectable with `fields=` on the read endpoints
+POST_COLUMNS = {
+    "id": "id",
+    "type": "type",
+    "caption": "caption",
+    "attributes": "attributes",
+    "vote_count": "vote_count",
+    "comment_count": "comment_count",
+    "expires_at": "expires_at",
+    "created_at": "created_at",
+    "is_removed": "is_removed",
+}
+ACTIVITY_COLUMNS = {
+    name: f"p.{column}" for name, column in POST_COLUMNS.items()
+} | {"user_voted_at": "v.created_at AS user_voted_at"}
+
+FEED_FIELDS = [
+    "id", "type", "caption", "items", "vote_count", "comment_count",
+    "has_voted", "expires_at", "created_at",
+]
+POST_FIELDS = FEED_FIELDS + ["attributes"]
+ACTIVITY_FIELDS = [
+    "id", "type", "caption", "items", "vote_count", "comment_count",
+    "expires_at", "created_at", "is_expired", "user_voted_at",
+]
+MY_POSTS_FIELDS = [
+    "id", "type", "caption", "items", "vote_count", "comment_count",
+    "expires_at", "created_at", "is_expired", "is_removed",
+]
+ITEM_FIELDS = ["id", "name", "image_url", "variants", "vote_count", "avg_scores"]
+ACTIVITY_ITEM_FIELDS = ["id", "name", "image_url", "variants", "vote_count"]
+
 
 def validate_post_items(post_type: str, items: list) -> None:
     if post_type == "wyr" and len(items) != 2:
@@ -78,6 +134,38 @@ async def create_post(post_data: PostCreate, request: Request, db=Depends(get_db
 
     caption = sanitize_text(post_data.caption) if post_data.caption else None
 
+    # Inline base64 images from older clients go to the image store, so
+    # items.image_url only ever holds a short URL; store URLs are saved as
+    # a relative path and made absolute per response
+    item_images = []
+    for item in post_data.items:
+        image_url = item.image_base64 or item.image_url or None
+        image_key = image_key_from_url(image_url)
+        if is_data_url(image_url):
+            # Same limit and derivatives as the upload route
+            try:
+                image_key, content_type, data = await run_in_threadpool(
+                    read_data_url, image_url, settings.max_image_size
+                )
+            except ImageTooLargeError:
+                raise HTTPException(
+                    status_code=413,
+                    detail={"error": "FILE_TOO_LARGE", "message": "Image must be under 5MB"},
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            image_key = await store_image(
+                image_key, content_type, len(data), io.BytesIO(data), db
+            )
+            derived = await create_derivatives(image_key)
+            if derived:
+                await set_image_dimensions(
+                    image_key, derived["width"], derived["height"], db
+                )
+        if image_key:
+            image_url = image_path_for(image_key)
+        item_images.append((image_url, image_key))
+
     async with db.transaction():
         post_id = await db.fetchval(
             """
@@ -87,7 +175,7 @@ async def create_post(post_data: PostCreate, request: Request, db=Depends(get_db
             """,
             post_data.type,
             caption,
-            json.dumps(post_data.attributes) if post_data.attributes else None,
+            post_data.attributes or None,
             expires_at,
             creator_token,
             browser_id,
@@ -100,38 +188,59 @@ async def create_post(post_data: PostCreate, request: Request, db=Depends(get_db
                     status_code=400, detail="Each item must have a name"
                 )
 
-            image_url = item.image_base64 or item.image_url or None
+            image_url, image_key = item_images[idx]
 
             await db.execute(
                 """
-                INSERT INTO items (post_id, name, image_url, order_index)
-                VALUES ($1, $2, $3, $4)
+                INSERT INTO items (post_id, name, image_url, image_key, order_index)
+                VALUES ($1, $2, $3, $4, $5)
                 """,
                 post_id,
                 name,
                 image_url,
+                image_key,
                 idx,
             )
 
+    # Otherwise the author would not see their post until the feeds expire
+    await invalidate_feed_cache()
+
     return {
         "success": True,
         "data": {
-            "id": str(post_id),
+            "id": post_id,
             "share_url": f"https://rateapp.com/p/{post_id}",
             "creator_token": creator_token,
         },
     }
 
 
-@router.get("/posts")
-async def get_posts(
-    request: Request,
-    type: str = Query("trending", pattern="^(trending|recent|random)$"),
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=20),
-    db=Depends(get_db),
-):
-    client_ip = get_client_ip(request)
+async def voted_post_ids(db, client_ip: str, post_ids: list) -> set:
+    """Ids of the given posts this client has voted on, in one query."""
+    if not post_ids:
+        return set()
+    rows = await db.fetch(
+        """
+        SELECT post_id FROM vote_locks
+        WHERE post_id = ANY($1::uuid[]) AND ip_hash = ANY($2::text[])
+        """,
+        post_ids,
+        [generate_ip_hash(client_ip, post_id) for post_id in post_ids],
+    )
+    return {row["post_id"] for row in rows}
+
+
+def is_expired(expires_at) -> bool:
+    if isinstance(expires_at, str):
+        # Entries read back from the cache carry ISO strings
+        expires_at = datetime.fromisoformat(expires_at)
+    return expires_at is not None and expires_at < datetime.now(timezone.utc)
+
+
+async def load_feed_page(
+    db, type: str, page: int, limit: int, selection: FieldSelection
+) -> dict:
+    """One page of a feed, without the per-viewer `has_voted` flag."""
     offset = (page - 1) * limit
 
     if type == "trending":
@@ -141,9 +250,10 @@ async def get_posts(
     else:
         order_clause = "RANDOM()"
 
+    columns = selection.columns(POST_COLUMNS, required=("id", "type"))
     posts = await db.fetch(
         f"""
-        SELECT id, type, caption, vote_count, comment_count, expires_at, created_at
+        SELECT {columns}
         FROM posts
         WHERE is_removed = FALSE
           AND (expires_at IS NULL OR expires_at > NOW())
@@ -164,77 +274,33 @@ async def get_posts(
 
     result_posts = []
     for post in posts:
-        post_id = post["id"]
-        ip_hash = generate_ip_hash(client_ip, str(post_id))
-
-        has_voted = await db.fetchval(
-            "SELECT 1 FROM vote_locks WHERE ip_hash = $1 AND post_id = $2",
-            ip_hash,
-            post_id,
-        )
-
-        items = await db.fetch(
-            """
-            SELECT id, name, image_url, vote_count
-            FROM items WHERE post_id = $1 ORDER BY order_index
-            """,
-            post_id,
-        )
-
-        items_data = []
-        for item in items:
-            avg_scores = None
-            if post["type"] in ["rate", "compare"] and item["vote_count"] > 0:
-                avg_scores = await calculate_avg_scores(db, item["id"])
-
-            items_data.append(
-                {
-                    "id": str(item["id"]),
-                    "name": item["name"],
-                    "image_url": item["image_url"],
-                    "vote_count": item["vote_count"],
-                    "avg_scores": avg_scores,
-                }
+        post_data = row_values(post, ("id", "type", "caption"))
+        if "items" in selection:
+            post_data["items"] = await fetch_items_data(
+                db, post["id"], post["type"], selection, with_scores=True
             )
-
-        result_posts.append(
-            {
-                "id": str(post_id),
-                "type": post["type"],
-                "caption": post["caption"],
-                "items": items_data,
-                "vote_count": post["vote_count"],
-                "comment_count": post["comment_count"],
-                "has_voted": has_voted is not None,
-                "expires_at": post["expires_at"].isoformat()
-                if post["expires_at"]
-                else None,
-                "created_at": post["created_at"].isoformat(),
-            }
+        post_data.update(
+            row_values(post, ("vote_count", "comment_count", "expires_at", "created_at"))
         )
+        result_posts.append(selection.pick(post_data))
 
     return {
-        "success": True,
-        "data": {
-            "posts": result_posts,
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "has_more": offset + len(posts) < total,
-            },
+        "posts": result_posts,
+        "pagination": {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "has_more": offset + len(posts) < total,
         },
     }
 
 
-@router.get("/posts/{post_id}")
-async def get_post(post_id: str, request: Request, db=Depends(get_db)):
-    client_ip = get_client_ip(request)
-    ip_hash = generate_ip_hash(client_ip, post_id)
-
+async def load_post(db, post_id: str, selection: FieldSelection) -> dict:
+    """A post without the per-viewer `has_voted` flag; `expires_at` is always set."""
+    columns = selection.columns(POST_COLUMNS, required=("id", "type", "expires_at"))
     post = await db.fetchrow(
-        """
-        SELECT id, type, caption, attributes, vote_count, comment_count, expires_at, created_at
+        f"""
+        SELECT {columns}
         FROM posts WHERE id = $1 AND is_removed = FALSE
         """,
         post_id,
@@ -243,125 +309,108 @@ async def get_post(post_id: str, request: Request, db=Depends(get_db)):
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    if post["expires_at"] and post["expires_at"] < datetime.now(timezone.utc):
-        raise HTTPException(status_code=410, detail="Post has expired")
-
-    has_voted = await db.fetchval(
-        "SELECT 1 FROM vote_locks WHERE ip_hash = $1 AND post_id = $2", ip_hash, post_id
+    post_data = row_values(post, ("id", "type", "caption"))
+    if "attributes" in selection:
+        post_data["attributes"] = post["attributes"]
+    if "items" in selection:
+        post_data["items"] = await fetch_items_data(
+            db, post_id, post["type"], selection, with_scores=True
+        )
+    post_data.update(
+        row_values(post, ("vote_count", "comment_count", "expires_at", "created_at"))
     )
+    return post_data
 
-    items = await db.fetch(
-        """
-        SELECT id, name, image_url, vote_count, total_score
-        FROM items WHERE post_id = $1 ORDER BY order_index
-        """,
-        post_id,
-    )
 
-    items_data = []
-    for item in items:
-        avg_scores = None
-        if post["type"] in ["rate", "compare"] and item["vote_count"] > 0:
-            avg_scores = await calculate_avg_scores(db, item["id"])
-
-        items_data.append(
-            {
-                "id": str(item["id"]),
-                "name": item["name"],
-                "image_url": item["image_url"],
-                "vote_count": item["vote_count"],
-                "avg_scores": avg_scores,
-            }
+async def viewer_votes(db, client_ip: str, post_ids: list) -> set:
+    """Posts this client voted on; empty while the database is unreachable."""
+    try:
+        return await voted_post_ids(db, client_ip, post_ids)
+    except DatabaseUnavailableError:
+        return set()
+
+
+# Cache misses are computed on a primary connection of their own, which a
+# background refresh can keep using after the request has finished. The
+# request's lazy `db` is only touched for the per-viewer overlay.
+
+
+@router.get("/posts")
+async def get_posts(
+    request: Request,
+    type: str = Query("trending", pattern="^(trending|recent|random)$"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=20),
+    fields: Optional[str] = Query(None),
+    db=Depends(get_db),
+):
+    client_ip = get_client_ip(request)
+    selection = FieldSelection(fields, FEED_FIELDS, ITEM_FIELDS)
+
+    async def compute():
+        async with get_db_connection() as conn:
+            return await load_feed_page(conn, type, page, limit, selection)
+
+    # Full trending and recent pages are shared by every viewer; random
+    # feeds and narrowed selections are cheap or unique, so not cached
+    if fields is None and type != "random":
+        feed, stale = await cache.get_or_compute(
+            await cache_key_feed(f"{type}:{page}:{limit}"), compute, FEED_CACHE_TTL
         )
+    else:
+        feed, stale = await load_feed_page(db, type, page, limit, selection), False
 
-    return {
-        "success": True,
-        "data": {
-            "id": str(post["id"]),
-            "type": post["type"],
-            "caption": post["caption"],
-            "attributes": json.loads(post["attributes"])
-            if post["attributes"]
-            else None,
-            "items": items_data,
-            "vote_count": post["vote_count"],
-            "comment_count": post["comment_count"],
-            "has_voted": has_voted is not None,
-            "expires_at": post["expires_at"].isoformat()
-            if post["expires_at"]
-            else None,
-            "created_at": post["created_at"].isoformat(),
+    posts = feed["posts"]
+    if "has_voted" in selection:
+        voted = await viewer_votes(db, client_ip, [post["id"] for post in posts])
+        posts = [{**post, "has_voted": post["id"] in voted} for post in posts]
+
+    return FastJSONResponse(
+        {
+            "success": True,
+            "data": {"posts": posts, "pagination": feed["pagination"]},
         },
-    }
+        headers={STALE_HEADER: "1"} if stale else None,
+    )
 
 
 @router.get("/posts/{post_id}")
-async def get_post(post_id: str, request: Request, db=Depends(get_db)):
+async def get_post(
+    post_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None),
+    db=Depends(get_db),
+):
+    # One cache entry per post, however the id was spelled
+    post_id = canonical_uuid(post_id, "Post not found")
     client_ip = get_client_ip(request)
-    ip_hash = generate_ip_hash(client_ip, post_id)
+    selection = FieldSelection(fields, POST_FIELDS, ITEM_FIELDS)
 
-    post = await db.fetchrow(
-        """
-        SELECT id, type, caption, attributes, vote_count, comment_count, expires_at, created_at
-        FROM posts WHERE id = $1 AND is_removed = FALSE
-        """,
-        post_id,
-    )
+    async def compute():
+        async with get_db_connection() as conn:
+            return await load_post(conn, post_id, selection)
 
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    if fields is None:
+        post_data, stale = await cache.get_or_compute(
+            await cache_key_post(post_id), compute, POST_CACHE_TTL
+        )
+    else:
+        post_data, stale = await load_post(db, post_id, selection), False
 
-    if post["expires_at"] and post["expires_at"] < datetime.now(timezone.utc):
+    if is_expired(post_data["expires_at"]):
         raise HTTPException(status_code=410, detail="Post has expired")
 
-    has_voted = await db.fetchval(
-        "SELECT 1 FROM vote_locks WHERE ip_hash = $1 AND post_id = $2", ip_hash, post_id
-    )
+    if "has_voted" in selection:
+        post_data = {
+            **post_data,
+            "has_voted": bool(await viewer_votes(db, client_ip, [post_id])),
+        }
 
-    items = await db.fetch(
-        """
-        SELECT id, name, image_url, vote_count, total_score
-        FROM items WHERE post_id = $1 ORDER BY order_index
-        """,
-        post_id,
+    return FastJSONResponse(
+        {"success": True, "data": selection.pick(post_data)},
+        headers={STALE_HEADER: "1"} if stale else None,
     )
 
-    items_data = []
-    for item in items:
-        avg_scores = None
-        if post["type"] in ["rate", "compare"] and item["vote_count"] > 0:
-            avg_scores = await calculate_avg_scores(db, item["id"])
-
-        items_data.append(
-            {
-                "id": str(item["id"]),
-                "name": item["name"],
-                "image_url": item["image_url"],
-                "vote_count": item["vote_count"],
-                "avg_scores": avg_scores,
-            }
-        )
-
-    return {
-        "success": True,
-        "data": {
-            "id": str(post["id"]),
-            "type": post["type"],
-            "caption": post["caption"],
-            "attributes": json.loads(post["attributes"])
-            if post["attributes"]
-            else None,
-            "items": items_data,
-            "vote_count": post["vote_count"],
-            "comment_count": post["comment_count"],
-            "has_voted": has_voted is not None,
-            "expires_at": post["expires_at"].isoformat()
-            if post["expires_at"]
-            else None,
-            "created_at": post["created_at"].isoformat(),
-        },
-    }
-
 
 @router.delete("/posts/{post_id}")
 async def delete_post(
@@ -375,6 +424,7 @@ async def delete_post(
     1. Using creator_token (legacy method) - via query parameter
     2. Using browser_id (new method) - via header (user can delete their own posts)
     """
+    post_id = canonical_uuid(post_id, "Post not found")
     browser_id = request.headers.get("X-Browser-ID")
     
     # Try to delete using browser_id first (if available)
@@ -389,7 +439,7 @@ async def delete_post(
         )
         
         if result != "UPDATE 0":
-            invalidate_post_cache(post_id)
+            await invalidate_post_cache(post_id)
             return {"success": True, "message": "Post deleted"}
     
     # Fallback to creator_token method
@@ -404,7 +454,7 @@ async def delete_post(
         )
 
         if result != "UPDATE 0":
-            invalidate_post_cache(post_id)
+            await invalidate_post_cache(post_id)
             return {"success": True, "message": "Post deleted"}
 
     raise HTTPException(status_code=404, detail="Post not found or unauthorized")
@@ -415,6 +465,7 @@ async def get_user_activity(
     request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=20),
+    fields: Optional[str] = Query(None),
     db=Depends(get_db)
 ):
     """
@@ -432,12 +483,15 @@ async def get_user_activity(
         )
     
     offset = (page - 1) * limit
+    selection = FieldSelection(fields, ACTIVITY_FIELDS, ACTIVITY_ITEM_FIELDS)
     
     # Get user's voted posts
+    columns = selection.columns(
+        ACTIVITY_COLUMNS, required=("id", "type", "expires_at", "user_voted_at")
+    )
     posts = await db.fetch(
-        """
-        SELECT DISTINCT p.id, p.type, p.caption, p.vote_count, p.comment_count, 
-               p.expires_at, p.created_at, v.created_at as user_voted_at
+        f"""
+        SELECT DISTINCT {columns}
         FROM posts p
         INNER JOIN votes v ON p.id = v.post_id
         WHERE (v.browser_id = $1 OR v.ip_hash = $2)
@@ -466,45 +520,18 @@ async def get_user_activity(
     result_posts = []
     now = datetime.now(timezone.utc)
     for post in posts:
-        post_id = post["id"]
-        
-        items = await db.fetch(
-            """
-            SELECT id, name, image_url, vote_count
-            FROM items WHERE post_id = $1 ORDER BY order_index
-            """,
-            post_id,
-        )
-        
-        items_data = []
-        for item in items:
-            items_data.append(
-                {
-                    "id": str(item["id"]),
-                    "name": item["name"],
-                    "image_url": item["image_url"],
-                    "vote_count": item["vote_count"],
-                }
+        post_data = row_values(post, ("id", "type", "caption"))
+        if "items" in selection:
+            post_data["items"] = await fetch_items_data(
+                db, post["id"], post["type"], selection
             )
-        
-        is_expired = post["expires_at"] and post["expires_at"] < now
-        
-        result_posts.append(
-            {
-                "id": str(post_id),
-                "type": post["type"],
-                "caption": post["caption"],
-                "items": items_data,
-                "vote_count": post["vote_count"],
-                "comment_count": post["comment_count"],
-                "expires_at": post["expires_at"].isoformat()
-                if post["expires_at"]
-                else None,
-                "created_at": post["created_at"].isoformat(),
-                "is_expired": is_expired,
-                "user_voted_at": post["user_voted_at"].isoformat(),
-            }
+        post_data.update(
+            row_values(post, ("vote_count", "comment_count", "expires_at", "created_at"))
         )
+        post_data["is_expired"] = post["expires_at"] and post["expires_at"] < now
+        post_data.update(row_values(post, ("user_voted_at",)))
+
+        result_posts.append(selection.pick(post_data))
     
     return {
         "success": True,
@@ -525,6 +552,7 @@ async def get_user_own_posts(
     request: Request,
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1, le=20),
+    fields: Optional[str] = Query(None),
     db=Depends(get_db)
 ):
     """
@@ -542,15 +570,16 @@ async def get_user_own_posts(
         )
 
     offset = (page - 1) * limit
+    selection = FieldSelection(fields, MY_POSTS_FIELDS, ACTIVITY_ITEM_FIELDS)
 
     # Get user's created posts
+    columns = selection.columns(POST_COLUMNS, required=("id", "type", "expires_at"))
     posts = await db.fetch(
-        """
-        SELECT p.id, p.type, p.caption, p.vote_count, p.comment_count,
-               p.expires_at, p.created_at, p.is_removed
-        FROM posts p
-        WHERE p.browser_id = $1
-        ORDER BY p.created_at DESC
+        f"""
+        SELECT {columns}
+        FROM posts
+        WHERE browser_id = $1
+        ORDER BY created_at DESC
         LIMIT $2 OFFSET $3
         """,
         browser_id,
@@ -569,45 +598,18 @@ async def get_user_own_posts(
     result_posts = []
     now = datetime.now(timezone.utc)
     for post in posts:
-        post_id = post["id"]
-
-        items = await db.fetch(
-            """
-            SELECT id, name, image_url, vote_count
-            FROM items WHERE post_id = $1 ORDER BY order_index
-            """,
-            post_id,
-        )
-
-        items_data = []
-        for item in items:
-            items_data.append(
-                {
-                    "id": str(item["id"]),
-                    "name": item["name"],
-                    "image_url": item["image_url"],
-                    "vote_count": item["vote_count"],
-                }
+        post_data = row_values(post, ("id", "type", "caption"))
+        if "items" in selection:
+            post_data["items"] = await fetch_items_data(
+                db, post["id"], post["type"], selection
             )
-
-        is_expired = post["expires_at"] and post["expires_at"] < now
-
-        result_posts.append(
-            {
-                "id": str(post_id),
-                "type": post["type"],
-                "caption": post["caption"],
-                "items": items_data,
-                "vote_count": post["vote_count"],
-                "comment_count": post["comment_count"],
-                "expires_at": post["expires_at"].isoformat()
-                if post["expires_at"]
-                else None,
-                "created_at": post["created_at"].isoformat(),
-                "is_expired": is_expired,
-                "is_removed": post["is_removed"],
-            }
+        post_data.update(
+            row_values(post, ("vote_count", "comment_count", "expires_at", "created_at"))
         )
+        post_data["is_expired"] = post["expires_at"] and post["expires_at"] < now
+        post_data.update(row_values(post, ("is_removed",)))
+
+        result_posts.append(selection.pick(post_data))
 
     return {
         "success": True,
@@ -623,6 +625,46 @@ async def get_user_own_posts(
     }
 
 
+async def fetch_items_data(
+    db, post_id, post_type: str, selection: FieldSelection, with_scores: bool = False
+) -> list:
+    """Items of a post, limited to the item fields the client asked for.
+
+    Image columns and score aggregation are skipped entirely unless selected.
+    """
+    columns = ["id", "vote_count"]
+    if selection.wants_item("name"):
+        columns.append("name")
+    if selection.wants_item("image_url") or selection.wants_item("variants"):
+        columns.append("image_url")
+
+    items = await db.fetch(
+        f"""
+        SELECT {', '.join(columns)}
+        FROM items WHERE post_id = $1 ORDER BY order_index
+        """,
+        post_id,
+    )
+
+    items_data = []
+    for item in items:
+        item_data = row_values(item, ("id", "name"))
+        if "image_url" in item:
+            item_data["image_url"] = public_image_url(item["image_url"])
+            item_data["variants"] = derivative_urls(item["image_url"])
+        item_data["vote_count"] = item["vote_count"]
+
+        if with_scores and selection.wants_item("avg_scores"):
+            avg_scores = None
+            if post_type in ["rate", "compare"] and item["vote_count"] > 0:
+                avg_scores = await calculate_avg_scores(db, item["id"])
+            item_data["avg_scores"] = avg_scores
+
+        items_data.append(selection.pick_item(item_data))
+
+    return items_data
+
+
 async def calculate_avg_scores(db, item_id: str) -> dict:
     votes = await db.fetch(
         "SELECT ratings FROM votes WHERE item_id = $1 AND ratings IS NOT NULL", item_id
@@ -635,7 +677,7 @@ async def calculate_avg_scores(db, item_id: str) -> dict:
     score_counts = {}
 
     for vote in votes:
-        ratings = json.loads(vote["ratings"]) if vote["ratings"] else {}
+        ratings = vote["ratings"] or {}
         for attr, score in ratings.items():
             if attr not in score_sums:
                 score_sums[attr] = 0
@@ -1,15 +1,22 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from app.database import get_db
 from app.schemas import ReportRequest
-from app.utils import get_client_ip, generate_ip_hash
+from app.utils import (
+    get_client_ip,
+    canonical_uuid,
+    generate_ip_hash,
+    invalidate_post_cache,
+)
+from app.utils.serialization import FastJSONRoute
 
-router = APIRouter(tags=["reports"])
+router = APIRouter(tags=["reports"], route_class=FastJSONRoute)
 
 
 @router.post("/posts/{post_id}/report")
 async def report_post(
     post_id: str, report_data: ReportRequest, request: Request, db=Depends(get_db)
 ):
+    post_id = canonical_uuid(post_id, "Post not found")
     client_ip = get_client_ip(request)
     ip_hash = generate_ip_hash(client_ip, post_id)
 
@@ -38,12 +45,19 @@ async def report_post(
             ip_hash,
         )
 
-        await db.execute(
+        # Enough reports hide the post (see the report trigger)
+        hidden = await db.fetchval(
             """
             UPDATE posts SET report_count = report_count + 1
             WHERE id = $1
+            RETURNING is_removed
             """,
             post_id,
         )
 
+    # Only a report that hid the post changes what is cached; invalidating on
+    # every report would let anyone flush all feeds
+    if hidden:
+        await invalidate_post_cache(post_id)
+
     return {"success": True, "message": "Report submitted. We'll review it shortly."}
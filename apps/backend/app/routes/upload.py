@@ -1,106 +1,65 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
 from app.config import get_settings
-import base64
-import hashlib
+from app.database import get_db
 import logging
-from multipart.multipart import parse_options_header
-from io import BytesIO
+
+from app.utils.upload_parser import (
+    receive_upload,
+    UploadTooLargeError,
+    InvalidMultipartError,
+)
+from app.utils.image_store import (
+    image_key,
+    image_url_for,
+    validate_image,
+    CONTENT_TYPES_BY_EXTENSION,
+)
+from app.utils.image_registry import find_image, store_image, set_image_dimensions
+from app.utils.image_derivatives import create_derivatives, derivative_urls
+from app.utils.serialization import FastJSONRoute
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["upload"])
+router = APIRouter(tags=["upload"], route_class=FastJSONRoute)
 settings = get_settings()
 
 
 @router.post("/upload/image")
-async def upload_image(request: Request):
-    """Upload image endpoint - manually parses multipart form data"""
+async def upload_image(request: Request, db=Depends(get_db)):
+    """Upload image endpoint - streams multipart form data into a bounded spool"""
     logger.info("=" * 50)
     logger.info("📤 UPLOAD REQUEST RECEIVED")
     logger.info("=" * 50)
     
+    upload = None
     try:
-        # Read the request body
-        body = await request.body()
-        logger.info(f"Request body size: {len(body)} bytes")
-        
-        # Get content type header
-        content_type = request.headers.get("content-type", "")
-        logger.info(f"Content-Type header: {content_type}")
-        
-        # Parse multipart form data manually
-        _, options = parse_options_header(content_type)
-        boundary = options.get(b"boundary")
-        
-        if not boundary:
-            logger.error("❌ No boundary found in content-type")
-            raise HTTPException(status_code=400, detail="Invalid multipart form data: missing boundary")
-        
-        logger.info(f"Boundary: {boundary}")
-        
-        # Split by boundary
-        boundary_str = b"--" + boundary
-        parts = body.split(boundary_str)
-        
-        logger.info(f"Number of parts: {len(parts)}")
-        
-        # Find the file part
-        file_data = None
-        file_filename = None
-        file_content_type = None
-        
-        for part in parts:
-            if not part or part == b"--\r\n" or part == b"--":
-                continue
-            
-            logger.info(f"Part size: {len(part)} bytes")
-            
-            # Split headers and content
-            if b"\r\n\r\n" in part:
-                header_section, content = part.split(b"\r\n\r\n", 1)
-            elif b"\n\n" in part:
-                header_section, content = part.split(b"\n\n", 1)
-            else:
-                continue
-            
-            headers = header_section.decode("utf-8", errors="ignore")
-            logger.info(f"Headers: {headers[:200]}")
-            
-            # Check if this is the file field
-            if 'name="image"' in headers or "name='image'" in headers:
-                # Extract filename
-                import re
-                filename_match = re.search(r'filename=["\']?([^"\';\r\n]+)', headers)
-                if filename_match:
-                    file_filename = filename_match.group(1)
-                    logger.info(f"Found file: {file_filename}")
-                
-                # Extract content type
-                ct_match = re.search(r'Content-Type:\s*([^\r\n]+)', headers, re.IGNORECASE)
-                if ct_match:
-                    file_content_type = ct_match.group(1).strip()
-                    logger.info(f"File content type: {file_content_type}")
-                
-                # Remove trailing \r\n-- from content
-                content = content.rstrip()
-                if content.endswith(b"--"):
-                    content = content[:-2]
-                content = content.rstrip(b"\r\n")
-                
-                file_data = content
-                logger.info(f"File data size: {len(file_data)} bytes")
-                break
-        
-        if not file_data:
+        # Stream the body into a bounded spool, hashing as it arrives
+        try:
+            upload = await receive_upload(request, "image", settings.max_image_size)
+        except UploadTooLargeError:
+            logger.error("❌ Upload exceeds the size limit, rejected while streaming")
+            raise HTTPException(
+                status_code=413,
+                detail={"error": "FILE_TOO_LARGE", "message": "Image must be under 5MB"},
+            )
+        except InvalidMultipartError as e:
+            logger.error(f"❌ Invalid multipart body: {e}")
+            raise HTTPException(status_code=400, detail=f"Invalid multipart form data: {e}")
+
+        if not upload or upload.size == 0:
             logger.error("❌ No file data found in request")
             raise HTTPException(status_code=400, detail="No file uploaded")
-        
+
+        file_filename = upload.filename
+        file_content_type = upload.content_type
+
         logger.info(f"\n📁 File info:")
         logger.info(f"  Filename: {file_filename}")
         logger.info(f"  Content-Type: {file_content_type}")
-        logger.info(f"  Size: {len(file_data)} bytes")
+        logger.info(f"  Size: {upload.size} bytes")
         
         # Validate file type
         allowed_types = ["image/jpeg", "image/png", "image/webp", "image/jpg"]
@@ -117,32 +76,48 @@ async def upload_image(request: Request):
                 },
             )
 
-        # Validate file size
-        logger.info(f"\n📏 Checking file size: {len(file_data)} bytes (max: {settings.max_image_size})")
-        if len(file_data) > settings.max_image_size:
-            logger.error(f"❌ File too large: {len(file_data)} bytes")
+        # Decide the format from the bytes themselves, before anything is stored
+        try:
+            extension = await run_in_threadpool(validate_image, upload.file)
+        except ValueError as e:
+            logger.error(f"❌ Rejected upload: {e}")
             raise HTTPException(
-                status_code=413,
-                detail={"error": "FILE_TOO_LARGE", "message": "Image must be under 5MB"},
+                status_code=400,
+                detail={"error": "INVALID_IMAGE", "message": str(e)},
+            )
+
+        content_hash = upload.hexdigest()
+        existing = await find_image(content_hash, db)
+        if existing:
+            # Seen before: reuse the stored blob and derivatives, no re-encoding
+            key = existing["image_key"]
+            logger.info(f"♻️ Duplicate upload, reusing {key}")
+        else:
+            # Store under the content hash; identical uploads share one blob
+            key = await store_image(
+                image_key(content_hash, extension),
+                CONTENT_TYPES_BY_EXTENSION[extension],
+                upload.size,
+                upload.file,
+                db,
             )
 
-        # Process file
-        logger.info("\n🔐 Generating file hash...")
-        file_hash = hashlib.md5(file_data).hexdigest()[:12]
-        extension = file_filename.split(".")[-1] if file_filename and "." in file_filename else "jpg"
-        image_key = f"uploads/{file_hash}.{extension}"
-        logger.info(f"✅ Hash: {file_hash}, Extension: {extension}, Key: {image_key}")
+            # Thumbnails are resized in a process pool, off the event loop
+            derived = await create_derivatives(key)
+            if derived:
+                await set_image_dimensions(key, derived["width"], derived["height"], db)
+            logger.info(f"✅ Stored {key}")
 
-        logger.info("\n📦 Encoding to base64...")
-        image_base64 = base64.b64encode(file_data).decode("utf-8")
-        content_type = file_content_type or "image/jpeg"
-        data_url = f"data:{content_type};base64,{image_base64}"
-        logger.info(f"✅ Base64 length: {len(image_base64)} chars")
+        image_url = image_url_for(key)
+        variants = derivative_urls(image_url)
 
         logger.info("\n✅ UPLOAD SUCCESSFUL")
         logger.info("=" * 50)
         
-        return {"success": True, "data": {"image_url": data_url, "image_key": image_key}}
+        return {
+            "success": True,
+            "data": {"image_url": image_url, "image_key": key, "variants": variants},
+        }
     
     except HTTPException as e:
         logger.error(f"❌ HTTP Exception: {e.status_code} - {e.detail}")
@@ -157,3 +132,6 @@ async def upload_image(request: Request):
                 "message": str(e),
             },
         )
+    finally:
+        if upload:
+            upload.close()
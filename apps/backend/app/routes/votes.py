@@ -1,18 +1,31 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from datetime import datetime, timezone
-import json
 
-from app.database import get_db
+from app.database import get_db, get_db_connection
 from app.schemas import VoteRequest, VoteCheckResponse
-from app.utils import get_client_ip, generate_ip_hash, has_voted_by_ip, sanitize_text
-
-router = APIRouter(tags=["votes"])
+from app.utils import (
+    get_client_ip,
+    canonical_uuid,
+    generate_ip_hash,
+    has_voted_by_ip,
+    sanitize_text,
+    cache,
+    cache_key_results,
+    invalidate_post_counts,
+    RESULTS_CACHE_TTL,
+    STALE_HEADER,
+)
+from app.utils.image_store import public_image_url
+from app.utils.serialization import FastJSONResponse, FastJSONRoute
+
+router = APIRouter(tags=["votes"], route_class=FastJSONRoute)
 
 
 @router.post("/posts/{post_id}/vote")
 async def submit_vote(
     post_id: str, vote_data: VoteRequest, request: Request, db=Depends(get_db)
 ):
+    post_id = canonical_uuid(post_id, "Post not found")
     client_ip = get_client_ip(request)
     ip_hash = generate_ip_hash(client_ip, post_id) # IP-only hash for fallback
     browser_id = request.headers.get("X-Browser-ID")
@@ -121,7 +134,7 @@ async def submit_vote(
                     item_id,
                     storage_ip_hash,
                     browser_id,
-                    json.dumps(item_ratings),
+                    item_ratings,
                 )
                 await db.execute(
                     "UPDATE items SET vote_count = vote_count + 1 WHERE id = $1",
@@ -144,8 +157,8 @@ async def submit_vote(
                 vote_data.item_id,
                 storage_ip_hash,
                 browser_id,
-                json.dumps(vote_data.ratings) if vote_data.ratings else None,
-                json.dumps(vote_data.ranking) if vote_data.ranking else None,
+                vote_data.ratings or None,
+                vote_data.ranking or None,
             )
 
             if vote_data.item_id:
@@ -162,6 +175,8 @@ async def submit_vote(
                         vote_data.item_id,
                     )
 
+    await invalidate_post_counts(post_id)
+
     return {
         "success": True,
         "message": "Vote recorded",
@@ -171,6 +186,7 @@ async def submit_vote(
 
 @router.get("/posts/{post_id}/vote-check")
 async def check_vote_status(post_id: str, request: Request, db=Depends(get_db)):
+    post_id = canonical_uuid(post_id, "Post not found")
     client_ip = get_client_ip(request)
     ip_hash = generate_ip_hash(client_ip, post_id) # IP-only hash for fallback
     browser_id = request.headers.get("X-Browser-ID")
@@ -187,7 +203,7 @@ async def check_vote_status(post_id: str, request: Request, db=Depends(get_db)):
                 "success": True,
                 "data": {
                     "has_voted": True,
-                    "voted_at": existing["created_at"].isoformat(),
+                    "voted_at": existing["created_at"],
                 },
             }
         # Has browser_id but no vote found — this device hasn't voted
@@ -203,14 +219,30 @@ async def check_vote_status(post_id: str, request: Request, db=Depends(get_db)):
     if vote:
         return {
             "success": True,
-            "data": {"has_voted": True, "voted_at": vote["created_at"].isoformat()},
+            "data": {"has_voted": True, "voted_at": vote["created_at"]},
         }
 
     return {"success": True, "data": {"has_voted": False, "voted_at": None}}
 
 
 @router.get("/posts/{post_id}/results")
-async def get_results(post_id: str, db=Depends(get_db)):
+async def get_results(post_id: str):
+    post_id = canonical_uuid(post_id, "Post not found")
+    async def compute():
+        async with get_db_connection() as db:
+            return await compute_results(post_id, db)
+
+    # No `db` dependency: results have no per-viewer part
+    data, stale = await cache.get_or_compute(
+        await cache_key_results(post_id), compute, RESULTS_CACHE_TTL
+    )
+    return FastJSONResponse(
+        {"success": True, "data": data},
+        headers={STALE_HEADER: "1"} if stale else None,
+    )
+
+
+async def compute_results(post_id: str, db) -> dict:
     post = await db.fetchrow(
         """
         SELECT id, type, caption, vote_count, comment_count, attributes, expires_at
@@ -235,13 +267,11 @@ async def get_results(post_id: str, db=Depends(get_db)):
             "SELECT ranking FROM votes WHERE post_id = $1 AND ranking IS NOT NULL",
             post_id,
         )
-        position_sums: dict = {str(item["id"]): 0 for item in items}
-        position_counts: dict = {str(item["id"]): 0 for item in items}
+        position_sums: dict = {item["id"]: 0 for item in items}
+        position_counts: dict = {item["id"]: 0 for item in items}
 
         for vote_row in all_rankings:
-            ranking_list = (
-                json.loads(vote_row["ranking"]) if vote_row["ranking"] else []
-            )
+            ranking_list = vote_row["ranking"] or []
             for position, item_id in enumerate(ranking_list):
                 if item_id in position_sums:
                     position_sums[item_id] += position + 1
@@ -249,14 +279,14 @@ async def get_results(post_id: str, db=Depends(get_db)):
 
         rank_items_data = []
         for item in items:
-            iid = str(item["id"])
+            iid = item["id"]
             count = position_counts[iid]
             avg_pos = round(position_sums[iid] / count, 2) if count > 0 else 999.0
             rank_items_data.append(
                 {
                     "id": iid,
                     "name": item["name"],
-                    "image_url": item["image_url"],
+                    "image_url": public_image_url(item["image_url"]),
                     "vote_count": count,
                     "avg_position": avg_pos,
                     "percentage": 0,
@@ -267,29 +297,24 @@ async def get_results(post_id: str, db=Depends(get_db)):
         winner = rank_items_data[0] if rank_items_data else None
 
         return {
-            "success": True,
-            "data": {
-                "post": {
-                    "id": str(post["id"]),
-                    "type": post["type"],
-                    "caption": post["caption"],
-                    "vote_count": post["vote_count"],
-                    "comment_count": post["comment_count"],
-                    "expires_at": post["expires_at"].isoformat()
-                    if post["expires_at"]
-                    else None,
-                },
-                "results": {
-                    "winner": {
-                        "item_id": winner["id"],
-                        "name": winner["name"],
-                        "avg_position": winner["avg_position"],
-                        "percentage": None,
-                    }
-                    if winner
-                    else None,
-                    "items": rank_items_data,
-                },
+            "post": {
+                "id": post["id"],
+                "type": post["type"],
+                "caption": post["caption"],
+                "vote_count": post["vote_count"],
+                "comment_count": post["comment_count"],
+                "expires_at": post["expires_at"],
+            },
+            "results": {
+                "winner": {
+                    "item_id": winner["id"],
+                    "name": winner["name"],
+                    "avg_position": winner["avg_position"],
+                    "percentage": None,
+                }
+                if winner
+                else None,
+                "items": rank_items_data,
             },
         }
 
@@ -310,7 +335,7 @@ async def get_results(post_id: str, db=Depends(get_db)):
                 distribution = {str(i): 0 for i in range(1, 11)}
 
                 for vote in votes:
-                    ratings = json.loads(vote["ratings"]) if vote["ratings"] else {}
+                    ratings = vote["ratings"] or {}
                     for attr, score in ratings.items():
                         if attr not in score_sums:
                             score_sums[attr] = 0
@@ -331,9 +356,9 @@ async def get_results(post_id: str, db=Depends(get_db)):
 
         items_data.append(
             {
-                "id": str(item["id"]),
+                "id": item["id"],
                 "name": item["name"],
-                "image_url": item["image_url"],
+                "image_url": public_image_url(item["image_url"]),
                 "vote_count": item["vote_count"],
                 "percentage": percentage,
                 "avg_scores": avg_scores,
@@ -354,31 +379,26 @@ async def get_results(post_id: str, db=Depends(get_db)):
             winner = max(items_data, key=lambda x: x["vote_count"])
 
     return {
-        "success": True,
-        "data": {
-            "post": {
-                "id": str(post["id"]),
-                "type": post["type"],
-                "caption": post["caption"],
-                "vote_count": post["vote_count"],
-                "comment_count": post["comment_count"],
-                "expires_at": post["expires_at"].isoformat()
-                if post["expires_at"]
-                else None,
-            },
-            "results": {
-                "winner": {
-                    "item_id": winner["id"],
-                    "name": winner["name"],
-                    "overall_score": sum(winner.get("avg_scores", {}).values())
-                    / len(winner.get("avg_scores", {}))
-                    if winner.get("avg_scores")
-                    else None,
-                    "percentage": winner["percentage"],
-                }
-                if winner
+        "post": {
+            "id": post["id"],
+            "type": post["type"],
+            "caption": post["caption"],
+            "vote_count": post["vote_count"],
+            "comment_count": post["comment_count"],
+            "expires_at": post["expires_at"],
+        },
+        "results": {
+            "winner": {
+                "item_id": winner["id"],
+                "name": winner["name"],
+                "overall_score": sum(winner.get("avg_scores", {}).values())
+                / len(winner.get("avg_scores", {}))
+                if winner.get("avg_scores")
                 else None,
-                "items": items_data,
-            },
+                "percentage": winner["percentage"],
+            }
+            if winner
+            else None,
+            "items": items_data,
         },
     }
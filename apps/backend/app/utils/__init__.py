@@ -1,5 +1,6 @@
 from .vote_security import (
     get_client_ip,
+    canonical_uuid,
     generate_ip_hash,
     generate_creator_token,
     has_voted_by_ip,
@@ -11,17 +12,29 @@ from .cache import (
     cache_key_post,
     cache_key_feed,
     cache_key_results,
+    cache_key_comments,
     invalidate_post_cache,
+    invalidate_post_counts,
+    invalidate_feed_cache,
+    invalidate_comment_thread,
     get_cached_feed,
     set_cached_feed,
     get_cached_post,
     set_cached_post,
     get_cached_results,
     set_cached_results,
+    get_cached_comments,
+    set_cached_comments,
+    COMMENT_CACHE_PAGES,
+    FEED_CACHE_TTL,
+    POST_CACHE_TTL,
+    RESULTS_CACHE_TTL,
+    STALE_HEADER,
 )
 
 __all__ = [
     "get_client_ip",
+    "canonical_uuid",
     "generate_ip_hash",
     "generate_creator_token",
     "has_voted_by_ip",
@@ -31,11 +44,22 @@ __all__ = [
     "cache_key_post",
     "cache_key_feed",
     "cache_key_results",
+    "cache_key_comments",
     "invalidate_post_cache",
+    "invalidate_post_counts",
+    "invalidate_feed_cache",
+    "invalidate_comment_thread",
     "get_cached_feed",
     "set_cached_feed",
     "get_cached_post",
     "set_cached_post",
     "get_cached_results",
     "set_cached_results",
+    "get_cached_comments",
+    "set_cached_comments",
+    "COMMENT_CACHE_PAGES",
+    "FEED_CACHE_TTL",
+    "POST_CACHE_TTL",
+    "RESULTS_CACHE_TTL",
+    "STALE_HEADER",
 ]
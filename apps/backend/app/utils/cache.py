@@ -1,124 +1,743 @@
-import json
-from typing import Optional, Any
-from datetime import datetime, timedelta
+import asyncio
+import fnmatch
+import heapq
+import logging
+import math
+import random
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+import asyncpg
 
 from app.config import get_settings
+from app.utils.serialization import dumps, loads
 
 settings = get_settings()
 
-redis_module = None
+redis_asyncio = None
 try:
-    import redis as redis_module
+    import redis.asyncio as redis_asyncio
 
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+# Keys fetched per SCAN round trip and deleted per UNLINK
+SCAN_BATCH_SIZE = 500
+
+# Redis pub/sub channel and Postgres NOTIFY channel for L1 invalidations
+INVALIDATION_CHANNEL = "cache_invalidate"
+
+# Generation tokens must outlive every entry keyed by them
+GENERATION_TTL = 24 * 3600
+
+# Reconnect backoff for the Postgres invalidation listener, and how often
+# an idle listener connection is checked
+LISTENER_RETRY_MIN = 1.0
+LISTENER_RETRY_MAX = 30.0
+LISTENER_HEALTH_INTERVAL = 30.0
+
+# Invalidations per broadcast; keeps a NOTIFY payload well under its 8000 bytes
+BROADCAST_BATCH_SIZE = 50
+
+# Eagerness of probabilistic early refresh; 0 disables it, above 1 refreshes sooner
+EARLY_REFRESH_BETA = 1.0
+
+# Response header marking a body served from an expired cache entry
+STALE_HEADER = "X-Cache-Stale"
+
+
+class CacheResult(NamedTuple):
+    value: Any
+    # True when the entry had expired and the database could not refresh it
+    stale: bool
+
+
+def is_outage(error: BaseException) -> bool:
+    """Whether `error` means the database is unreachable, not that the value is gone."""
+    # Imported here: app.database imports this module
+    from app.database import DatabaseUnavailableError, LOST_CONNECTION_ERRORS
+
+    return isinstance(
+        error, (DatabaseUnavailableError, asyncio.TimeoutError, *LOST_CONNECTION_ERRORS)
+    )
+
+
+class LocalCache:
+    """Bounded in-process LRU cache.
+
+    Entries are evicted least-recently-used first once either the entry or
+    the byte budget is exceeded; sizes are the encoded JSON length. Expiry
+    uses the monotonic clock and a heap, so expired entries are dropped on
+    writes rather than lingering until read. Keys are indexed by their
+    `:`-delimited prefixes, so deleting `prefix:*` touches only the keys
+    under that prefix.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        # key -> (value, expires_at, size)
+        self._entries: OrderedDict[str, tuple[Any, float, int]] = OrderedDict()
+        self._expiry: list[tuple[float, str]] = []
+        self._prefixes: dict[str, set[str]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value: Any, ttl_seconds: float, size: Optional[int] = None) -> None:
+        now = time.monotonic()
+        self._expire(now)
+
+        if size is None:
+            size = len(dumps(value))
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+
+        expires_at = now + ttl_seconds
+        self._entries[key] = (value, expires_at, size)
+        self.size += size
+        heapq.heappush(self._expiry, (expires_at, key))
+        for prefix in self._key_prefixes(key):
+            self._prefixes.setdefault(prefix, set()).add(key)
+
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def delete_pattern(self, pattern: str) -> None:
+        prefix = pattern[:-1]
+        if pattern.endswith(":*") and "*" not in prefix:
+            keys = list(self._prefixes.get(prefix, ()))
+        else:
+            keys = [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]
+        for key in keys:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+        for prefix in self._key_prefixes(key):
+            keys = self._prefixes.get(prefix)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._prefixes[prefix]
+
+    def _expire(self, now: float) -> None:
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            # Overwritten keys leave older heap items behind; skip those
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+
+        # Keep the heap from growing with items for evicted or replaced keys
+        if len(self._expiry) > 2 * len(self._entries) + 64:
+            self._expiry = [(entry[1], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    @staticmethod
+    def _key_prefixes(key: str) -> list[str]:
+        parts = key.split(":")[:-1]
+        return [":".join(parts[: i + 1]) + ":" for i in range(len(parts))]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class CacheBackend:
+    """Two-tier async cache: a process-local L1 in front of Redis as L2.
+
+    With Redis, L1 holds entries for only `cache_local_ttl` seconds so hot
+    keys are served from memory without drifting far from L2; without
+    Redis, L1 is the whole cache. Deletes are broadcast to every worker -
+    over Redis pub/sub, or Postgres NOTIFY when there is no Redis - and
+    applied to each worker's L1. While the Postgres listener is down,
+    generation tokens are held in L1 for only `cache_local_ttl` seconds,
+    since bumps from other workers would go unseen.
+
+    Redis is reached through a pooled asyncio client with short socket
+    timeouts, so a slow or missing Redis degrades to L1 instead of
+    stalling the event loop.
+
+    Values come back JSON-shaped from either tier: datetimes and UUIDs
+    are strings whether the entry was read from L1 or L2.
+    """
+
     def __init__(self):
-        self._cache: dict[str, tuple[Any, datetime]] = {}
+        self._local = LocalCache(
+            settings.cache_local_max_entries, settings.cache_local_max_bytes
+        )
         self._redis_client: Any = None
+        self._listener_client: Any = None
+        self._listener_conn: Any = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._listener_down_logged = False
+        # key -> future resolved by the one request computing that key
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshes: set[asyncio.Task] = set()
+        # Invalidations waiting for the next broadcast, and the task sending it
+        self._pending_broadcasts: list[dict] = []
+        self._broadcast_task: Optional[asyncio.Task] = None
+
+        if REDIS_AVAILABLE and redis_asyncio and settings.redis_url:
+            try:
+                pool = redis_asyncio.ConnectionPool.from_url(
+                    settings.redis_url,
+                    max_connections=settings.redis_pool_size,
+                    socket_timeout=settings.redis_socket_timeout,
+                    socket_connect_timeout=settings.redis_socket_timeout,
+                )
+                self._redis_client = redis_asyncio.Redis(connection_pool=pool)
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable: {e}")
+
+    @property
+    def redis(self) -> Any:
+        """The Redis client shared by every worker, or None without Redis."""
+        return self._redis_client
+
+    def _local_ttl(self, ttl_seconds: float) -> float:
+        if self._redis_client:
+            return min(ttl_seconds, settings.cache_local_ttl)
+        return ttl_seconds
 
-        if REDIS_AVAILABLE and redis_module and settings.redis_url:
+    def _generation_ttl(self) -> float:
+        if not self._redis_client and not self._listener_conn:
+            return min(GENERATION_TTL, settings.cache_local_ttl)
+        return self._local_ttl(GENERATION_TTL)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+
+        if self._redis_client:
             try:
-                self._redis_client = redis_module.from_url(settings.redis_url)
+                data = await self._redis_client.get(key)
+                if data:
+                    value = loads(data)
+                    self._local.set(key, value, settings.cache_local_ttl, size=len(data))
+                    return value
             except Exception:
                 pass
 
-    def get(self, key: str) -> Optional[Any]:
-        if self._redis_client:
+        return None
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Fetch several keys, going to L2 once for all L1 misses."""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._local.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+
+        if missing and self._redis_client:
             try:
-                value = self._redis_client.get(key)
-                if value:
-                    return json.loads(value)
+                for key, data in zip(missing, await self._redis_client.mget(missing)):
+                    if data:
+                        found[key] = loads(data)
+                        self._local.set(
+                            key, found[key], settings.cache_local_ttl, size=len(data)
+                        )
             except Exception:
                 pass
 
-        if key in self._cache:
-            value, expires_at = self._cache[key]
-            if datetime.now() < expires_at:
-                return value
-            del self._cache[key]
+        return found
 
-        return None
+    async def set(self, key: str, value: Any, ttl_seconds: int = 300) -> None:
+        await self._store(key, value, ttl_seconds)
 
-    def set(self, key: str, value: Any, ttl_seconds: int = 300) -> None:
+    async def _store(self, key: str, value: Any, ttl_seconds: int) -> Any:
+        """Write both tiers; returns the value as readers will see it."""
+        data = dumps(value)
         if self._redis_client:
             try:
-                self._redis_client.setex(key, ttl_seconds, json.dumps(value))
-                return
+                await self._redis_client.setex(key, ttl_seconds, data)
             except Exception:
                 pass
 
-        expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
-        self._cache[key] = (value, expires_at)
+        value = loads(data)
+        self._local.set(key, value, self._local_ttl(ttl_seconds), size=len(data))
+        return value
 
-    def delete(self, key: str) -> None:
+    async def set_many(self, values: dict[str, Any], ttl_seconds: int = 300) -> None:
+        """Store several keys with one pipelined round trip."""
+        if not values:
+            return
+
+        encoded = {key: dumps(value) for key, value in values.items()}
+        if self._redis_client:
+            try:
+                async with self._redis_client.pipeline(transaction=False) as pipe:
+                    for key, data in encoded.items():
+                        pipe.setex(key, ttl_seconds, data)
+                    await pipe.execute()
+            except Exception:
+                pass
+
+        for key, data in encoded.items():
+            self._local.set(
+                key, loads(data), self._local_ttl(ttl_seconds), size=len(data)
+            )
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: int = 300,
+    ) -> CacheResult:
+        """Cached value for `key`, computing it on a miss.
+
+        Entries are fresh for `ttl_seconds` and kept `cache_stale_ttl`
+        longer. An expired entry is recomputed, once for all concurrent
+        callers; only if that fails because the database is unreachable is
+        the last known value served, marked stale. Any other failure, such
+        as a 404 for a removed post, drops the entry and propagates. Fresh
+        entries close to expiry are also refreshed early in the background
+        at random - likelier the closer to expiry and the slower the
+        computation - so hot keys rarely expire at all.
+
+        `compute` must acquire its own connection: a refresh can outlive
+        the request that started it.
+        """
+        entry = await self.get(key)
+        if entry is not None:
+            now = time.time()
+            if now < entry["expires_at"]:
+                if self._should_refresh_early(entry, now):
+                    self._refresh_in_background(key, compute, ttl_seconds)
+                return CacheResult(entry["value"], False)
+            try:
+                return CacheResult(await self._recompute(key, compute, ttl_seconds), False)
+            except Exception as e:
+                if not is_outage(e):
+                    raise
+                return CacheResult(entry["value"], True)
+
+        return CacheResult(await self._compute_once(key, compute, ttl_seconds), False)
+
+    async def _recompute(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl_seconds: int
+    ) -> Any:
+        """Recompute a cached entry, dropping it unless the failure is an outage."""
+        try:
+            return await self._compute_once(key, compute, ttl_seconds)
+        except Exception as e:
+            if not is_outage(e):
+                await self.delete(key)
+            raise
+
+    async def _compute_once(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl_seconds: int
+    ) -> Any:
+        """Run `compute` and store the result, once per key at a time.
+
+        Concurrent callers await the same future; exceptions reach every
+        waiter and are not cached.
+        """
+        while key in self._inflight:
+            future = self._inflight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The computing request was cancelled; take over from it
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            started = time.monotonic()
+            value = await compute()
+            stored = await self._store(
+                key,
+                {
+                    "value": value,
+                    "delta": time.monotonic() - started,
+                    "expires_at": time.time() + ttl_seconds,
+                },
+                ttl_seconds + settings.cache_stale_ttl,
+            )
+            future.set_result(stored["value"])
+            return stored["value"]
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unwaited failure is not logged again
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _refresh_in_background(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl_seconds: int
+    ) -> None:
+        if key in self._inflight:
+            return
+        task = asyncio.create_task(self._recompute(key, compute, ttl_seconds))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background cache refresh failed: {task.exception()}")
+
+    @staticmethod
+    def _should_refresh_early(entry: dict, now: float) -> bool:
+        if EARLY_REFRESH_BETA <= 0:
+            return False
+        # -log(u) for u in (0, 1] is an exponential sample scaled by the
+        # compute time: expensive entries start refreshing further ahead
+        gap = -entry["delta"] * EARLY_REFRESH_BETA * math.log(1.0 - random.random())
+        return now + gap >= entry["expires_at"]
+
+    async def delete(self, key: str) -> None:
         if self._redis_client:
             try:
-                self._redis_client.delete(key)
+                await self._redis_client.unlink(key)
             except Exception:
                 pass
 
-        if key in self._cache:
-            del self._cache[key]
+        self._local.delete(key)
+        await self._broadcast({"op": "delete", "key": key})
 
-    def delete_pattern(self, pattern: str) -> None:
+    async def delete_pattern(self, pattern: str) -> None:
         if self._redis_client:
             try:
-                keys = self._redis_client.keys(pattern)
-                if keys and len(keys) > 0:
-                    self._redis_client.delete(*keys)
+                # SCAN walks the keyspace incrementally, unlike KEYS, and
+                # UNLINK frees values off the Redis main thread
+                batch = []
+                async for key in self._redis_client.scan_iter(
+                    match=pattern, count=SCAN_BATCH_SIZE
+                ):
+                    batch.append(key)
+                    if len(batch) >= SCAN_BATCH_SIZE:
+                        await self._redis_client.unlink(*batch)
+                        batch = []
+                if batch:
+                    await self._redis_client.unlink(*batch)
             except Exception:
                 pass
 
-        pattern_prefix = pattern.replace("*", "")
-        keys_to_delete = [k for k in self._cache.keys() if pattern_prefix in k]
-        for key in keys_to_delete:
-            del self._cache[key]
+        self._local.delete_pattern(pattern)
+        await self._broadcast({"op": "delete_pattern", "key": pattern})
+
+    async def generation(self, name: str) -> str:
+        return (await self.generations(name))[0]
+
+    async def generations(self, *names: str) -> list[str]:
+        """Current generation tokens, creating any that do not exist yet.
+
+        Tokens are random rather than counters, so a generation that was
+        evicted and recreated can never match keys built from an old one.
+        """
+        keys = [f"gen:{name}" for name in names]
+        found = await self.get_many(keys)
+
+        for key in keys:
+            if key in found:
+                continue
+            token = secrets.token_hex(4)
+            if self._redis_client:
+                try:
+                    # Another worker may create it first; its token wins
+                    created = await self._redis_client.set(
+                        key, dumps(token), nx=True, ex=GENERATION_TTL
+                    )
+                    if not created:
+                        data = await self._redis_client.get(key)
+                        token = loads(data) if data else token
+                except Exception:
+                    pass
+            self._local.set(key, token, self._generation_ttl())
+            found[key] = token
+
+        return [found[key] for key in keys]
+
+    async def bump_generation(self, name: str) -> None:
+        """Invalidate every key built from this generation in O(1)."""
+        key = f"gen:{name}"
+        token = secrets.token_hex(4)
+        if self._redis_client:
+            try:
+                await self._redis_client.set(key, dumps(token), ex=GENERATION_TTL)
+            except Exception:
+                pass
+
+        self._local.set(key, token, self._generation_ttl())
+        # Other workers drop their copy and re-read or re-create it
+        await self._broadcast({"op": "delete", "key": key})
+
+    async def _broadcast(self, message: dict) -> None:
+        """Tell the other workers to drop the same entries from their L1.
+
+        Messages are queued and sent by a background task, so everything a
+        request invalidates before it next yields goes out as one publish
+        or NOTIFY rather than a round trip per key.
+        """
+        self._pending_broadcasts.append(message)
+        if self._broadcast_task is None:
+            self._broadcast_task = asyncio.create_task(self._send_broadcasts())
+
+    async def _send_broadcasts(self) -> None:
+        messages, self._pending_broadcasts = self._pending_broadcasts, []
+        self._broadcast_task = None
+        try:
+            if self._redis_client:
+                for start in range(0, len(messages), BROADCAST_BATCH_SIZE):
+                    payload = dumps(messages[start:start + BROADCAST_BATCH_SIZE])
+                    await self._redis_client.publish(INVALIDATION_CHANNEL, payload)
+            else:
+                # Sent even while this worker's own listener is down; the
+                # others may still be listening
+                from app.database import get_db_connection
+
+                async with get_db_connection() as db:
+                    for start in range(0, len(messages), BROADCAST_BATCH_SIZE):
+                        payload = dumps(messages[start:start + BROADCAST_BATCH_SIZE])
+                        await db.execute(
+                            "SELECT pg_notify($1, $2)",
+                            INVALIDATION_CHANNEL,
+                            payload.decode("utf-8"),
+                        )
+        except Exception as e:
+            logger.warning(f"Cache invalidation broadcast failed: {e}")
+
+    def _apply(self, payload) -> None:
+        messages = loads(payload)
+        # A single message from a worker still running the older format
+        if isinstance(messages, dict):
+            messages = [messages]
+        for message in messages:
+            if message["op"] == "delete":
+                self._local.delete(message["key"])
+            elif message["op"] == "delete_pattern":
+                self._local.delete_pattern(message["key"])
+
+    async def start_listener(self) -> None:
+        """Subscribe to invalidations broadcast by other workers.
+
+        The subscription runs in a background task that reconnects for as
+        long as the app is up, so a database or Redis outage at startup or
+        later only interrupts it.
+        """
+        try:
+            if self._redis_client:
+                # Own client: the pooled one's short read timeout would
+                # keep interrupting an idle subscription
+                self._listener_client = redis_asyncio.from_url(settings.redis_url)
+                self._listener_task = asyncio.create_task(self._listen_redis())
+            else:
+                self._listener_task = asyncio.create_task(self._listen_postgres())
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener not started: {e}")
+
+    async def _listen_postgres(self) -> None:
+        from app.database import _get_ssl_context
+
+        delay = LISTENER_RETRY_MIN
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(
+                    settings.database_url, ssl=_get_ssl_context()
+                )
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _conn: lost.set())
+                await conn.add_listener(
+                    INVALIDATION_CHANNEL,
+                    lambda _conn, pid, channel, payload: self._apply(payload),
+                )
+                # Tokens cached while unsubscribed may have missed a bump
+                self._local.delete_pattern("gen:*")
+                self._listener_conn = conn
+                if self._listener_down_logged:
+                    logger.info("Cache invalidation listener reconnected")
+                self._listener_down_logged = False
+                delay = LISTENER_RETRY_MIN
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), LISTENER_HEALTH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # A dead peer is not always reported; probe it
+                        await conn.fetchval("SELECT 1", timeout=5)
+                raise ConnectionError("listener connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._listener_conn is not None:
+                    # Bumps from now on go unseen; stop trusting held tokens
+                    self._local.delete_pattern("gen:*")
+                    self._listener_conn = None
+                if not self._listener_down_logged:
+                    logger.warning(
+                        f"Cache invalidation listener down, retrying: {e}; "
+                        f"generation tokens are held for "
+                        f"{settings.cache_local_ttl}s until it is back"
+                    )
+                    self._listener_down_logged = True
+                if conn is not None:
+                    conn.terminate()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LISTENER_RETRY_MAX)
+
+    async def _listen_redis(self) -> None:
+        while True:
+            try:
+                async with self._listener_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._apply(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription lost: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        for task in list(self._refreshes):
+            task.cancel()
+        if self._broadcast_task:
+            # Deliver what is queued before the connections go away
+            await self._broadcast_task
+        if self._listener_task:
+            self._listener_task.cancel()
+        if self._listener_client:
+            await self._listener_client.aclose()
+        if self._listener_conn:
+            await self._listener_conn.close()
+            self._listener_conn = None
+        if self._redis_client:
+            await self._redis_client.aclose()
 
 
 cache = CacheBackend()
 
 
-def cache_key_post(post_id: str) -> str:
-    return f"post:{post_id}"
+# Cache keys embed generation tokens. Invalidating replaces a token, which
+# orphans every key built from the old one; orphans expire on their own TTL.
+# `post:<id>` changes when the post is removed and `post_counts:<id>` on
+# every vote, so votes never touch the post's comment pages.
+
+
+async def cache_key_post(post_id: str) -> str:
+    post_generation, counts_generation = await cache.generations(
+        f"post:{post_id}", f"post_counts:{post_id}"
+    )
+    return f"post:{post_id}:{post_generation}.{counts_generation}"
+
+
+async def cache_key_feed(feed_type: str) -> str:
+    generation = await cache.generation("feed")
+    return f"feed:{generation}:{feed_type}"
+
+
+async def cache_key_results(post_id: str) -> str:
+    post_generation, counts_generation = await cache.generations(
+        f"post:{post_id}", f"post_counts:{post_id}"
+    )
+    return f"results:{post_id}:{post_generation}.{counts_generation}"
+
+
+# Only the first few pages of a thread are hot enough to be worth caching
+COMMENT_CACHE_PAGES = 3
+
+
+def comment_thread_name(post_id: str, parent_id: Optional[str]) -> str:
+    return f"comments:{post_id}:{parent_id or 'root'}"
+
+
+async def cache_key_comments(
+    post_id: str, parent_id: Optional[str], page: int, limit: int
+) -> str:
+    post_generation, thread_generation = await cache.generations(
+        f"post:{post_id}", comment_thread_name(post_id, parent_id)
+    )
+    return (
+        f"{comment_thread_name(post_id, parent_id)}:"
+        f"{post_generation}.{thread_generation}:{page}:{limit}"
+    )
+
+
+# Feeds are not invalidated by votes, so their counts lag by at most this
+FEED_CACHE_TTL = 30
+POST_CACHE_TTL = 60
+RESULTS_CACHE_TTL = 300
+
+
+async def invalidate_post_cache(post_id: str) -> None:
+    await cache.bump_generation(f"post:{post_id}")
+    await invalidate_feed_cache()
+
+
+async def invalidate_feed_cache() -> None:
+    """Drop every cached feed, e.g. once a new post can appear in them."""
+    await cache.bump_generation("feed")
+
+
+async def invalidate_post_counts(post_id: str) -> None:
+    """Drop the post and its results after a vote or comment; feeds stay."""
+    await cache.bump_generation(f"post_counts:{post_id}")
 
 
-def cache_key_feed(feed_type: str) -> str:
-    return f"feed:{feed_type}"
+async def invalidate_comment_thread(post_id: str, parent_id: Optional[str]) -> None:
+    await cache.bump_generation(comment_thread_name(post_id, parent_id))
 
 
-def cache_key_results(post_id: str) -> str:
-    return f"results:{post_id}"
+async def get_cached_feed(key: str) -> Optional[list[dict]]:
+    return await cache.get(key)
 
 
-def invalidate_post_cache(post_id: str) -> None:
-    cache.delete(cache_key_post(post_id))
-    cache.delete(cache_key_results(post_id))
-    cache.delete_pattern("feed:*")
+async def set_cached_feed(key: str, posts: list[dict], ttl: int = 300) -> None:
+    await cache.set(key, posts, ttl)
 
 
-def get_cached_feed(feed_type: str) -> Optional[list[dict]]:
-    return cache.get(cache_key_feed(feed_type))
+async def get_cached_post(key: str) -> Optional[dict]:
+    return await cache.get(key)
 
 
-def set_cached_feed(feed_type: str, posts: list[dict], ttl: int = 300) -> None:
-    cache.set(cache_key_feed(feed_type), posts, ttl)
+async def set_cached_post(key: str, post: dict, ttl: int = 300) -> None:
+    await cache.set(key, post, ttl)
 
 
-def get_cached_post(post_id: str) -> Optional[dict]:
-    return cache.get(cache_key_post(post_id))
+async def get_cached_results(key: str) -> Optional[dict]:
+    return await cache.get(key)
 
 
-def set_cached_post(post_id: str, post: dict, ttl: int = 300) -> None:
-    cache.set(cache_key_post(post_id), post, ttl)
+async def set_cached_results(key: str, results: dict, ttl: int = 300) -> None:
+    await cache.set(key, results, ttl)
 
 
-def get_cached_results(post_id: str) -> Optional[dict]:
-    return cache.get(cache_key_results(post_id))
+async def get_cached_comments(key: str) -> Optional[dict]:
+    return await cache.get(key)
 
 
-def set_cached_results(post_id: str, results: dict, ttl: int = 300) -> None:
-    cache.set(cache_key_results(post_id), results, ttl)
+async def set_cached_comments(key: str, comments_page: dict, ttl: int = 60) -> None:
+    await cache.set(key, comments_page, ttl)
@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Brotli and zstd are optional; gzip is always available
+brotli = None
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+zstandard = None
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Statuses whose bodies are empty, partial or already negotiated elsewhere
+SKIPPED_STATUSES = {204, 206, 304}
+
+
+def _compress_br(data: bytes) -> bytes:
+    return brotli.compress(data, quality=5)
+
+
+def _compress_zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _compress_gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def available_encodings() -> dict[str, Callable[[bytes], bytes]]:
+    """Supported content codings, in server preference order."""
+    encodings = {}
+    if BROTLI_AVAILABLE:
+        encodings["br"] = _compress_br
+    if ZSTD_AVAILABLE:
+        encodings["zstd"] = _compress_zstd
+    encodings["gzip"] = _compress_gzip
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, encodings) -> Optional[str]:
+    """Pick the best coding the client accepts, honouring q-values."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in encodings:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith("+json")
+        or media_type in COMPRESSIBLE_TYPES
+    )
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by body digest and coding.
+
+    Hot responses such as cached feeds and results render to identical
+    bytes, so after the first request each coding is served from here and
+    only costs a hash of the body.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+
+    def get(self, key: tuple[bytes, str]) -> Optional[bytes]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple[bytes, str], value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """Compress whole-body responses with br, zstd or gzip.
+
+    Replaces GZipMiddleware: the coding is negotiated from Accept-Encoding,
+    compressed bodies are reused from an LRU, and large bodies are
+    compressed in a worker thread so the event loop is not blocked.
+    Streaming responses (images, ranges) pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        thread_minimum_size: int = 64 * 1024,
+        cache_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_minimum_size = thread_minimum_size
+        self.encodings = available_encodings()
+        self.cache = CompressedBodyCache(cache_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] in SKIPPED_STATUSES
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                # Streamed or small: send as-is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = await self.compress(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    async def compress(self, body: bytes, encoding: str) -> bytes:
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        compressed = self.cache.get(key)
+        if compressed is not None:
+            return compressed
+
+        compress = self.encodings[encoding]
+        if len(body) >= self.thread_minimum_size:
+            compressed = await run_in_threadpool(compress, body)
+        else:
+            compressed = compress(body)
+
+        self.cache.set(key, compressed)
+        return compressed
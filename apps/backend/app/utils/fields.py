@@ -0,0 +1,70 @@
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+
+
+class FieldSelection:
+    """Fields requested through a `fields=` query parameter.
+
+    `fields=id,vote_count` narrows a response to those keys; `items` selects
+    whole items and `items.<name>` selects individual item fields. Without
+    the parameter every field is returned.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[str],
+        allowed: Iterable[str],
+        item_fields: Iterable[str] = (),
+    ):
+        self.allowed = list(allowed)
+        self.item_allowed = list(item_fields)
+        self.fields: Optional[set[str]] = None
+        self.item_fields: Optional[set[str]] = None
+
+        if not fields:
+            return
+
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        top = {f for f in requested if not f.startswith("items.")}
+        nested = {f[len("items."):] for f in requested if f.startswith("items.")}
+
+        unknown = (top - set(self.allowed)) | {
+            f"items.{f}" for f in nested - set(self.item_allowed)
+        }
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+        self.fields = set(top)
+        if nested:
+            self.fields.add("items")
+            if "items" not in top:
+                self.item_fields = nested
+
+    def __contains__(self, name: str) -> bool:
+        return self.fields is None or name in self.fields
+
+    def wants_item(self, name: str) -> bool:
+        return "items" in self and (self.item_fields is None or name in self.item_fields)
+
+    def columns(self, mapping: dict[str, str], required: Iterable[str] = ()) -> str:
+        """SQL select list for the requested fields plus `required` ones."""
+        names = [
+            n for n in mapping
+            if n in required or (n in self.allowed and n in self)
+        ]
+        return ", ".join(mapping[n] for n in names)
+
+    def pick(self, data: dict) -> dict:
+        return {k: v for k, v in data.items() if k in self}
+
+    def pick_item(self, data: dict) -> dict:
+        return {k: v for k, v in data.items() if self.wants_item(k)}
+
+
+def row_values(row, names: Iterable[str]) -> dict:
+    """Values of the given columns, for the columns the row has."""
+    return {name: row[name] for name in names if name in row}
@@ -0,0 +1,127 @@
+import os
+import re
+from typing import Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 64 * 1024
+
+# A year is the longest max-age caches reliably honour
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ByteRangeNotSatisfiable(Exception):
+    pass
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single `bytes=` range into inclusive (start, end) offsets.
+
+    Returns None when the header is absent or asks for several ranges, in
+    which case the whole file is sent.
+    """
+    if not range_header or "," in range_header:
+        return None
+
+    match = RANGE_RE.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ByteRangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ByteRangeNotSatisfiable()
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """Send all or part of a file without loading it into memory.
+
+    Whole files go out through the ASGI `http.response.pathsend` extension
+    when the server offers it, letting the server use sendfile(); otherwise,
+    and for byte ranges, the file is streamed in chunks read off the event
+    loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        media_type: str,
+        headers: dict,
+        byte_range: Optional[tuple[int, int]] = None,
+    ):
+        self.path = path
+        self.byte_range = byte_range
+        start, end = byte_range or (0, size - 1)
+        self.offset = start
+        self.length = end - start + 1 if size else 0
+
+        headers = {**headers, "content-length": str(self.length)}
+        if byte_range:
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        super().__init__(
+            status_code=206 if byte_range else 200,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if self.byte_range is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+
+        if remaining > 0 or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
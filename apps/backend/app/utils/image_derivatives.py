@@ -0,0 +1,182 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.image_store import (
+    LocalImageStore,
+    IMAGE_KEY_RE,
+    image_store,
+    image_url_for,
+    image_key_from_url,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+Image = None
+ImageOps = None
+try:
+    from PIL import Image, ImageOps
+
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Longest edge, in pixels, of each derivative
+DERIVATIVE_SIZES = (768, 256)
+
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def derivative_key(content_hash: str, size: int, extension: str) -> str:
+    return f"{content_hash}_{size}.{extension}"
+
+
+def generate_derivatives(source_path: str, store_root: str, content_hash: str) -> dict:
+    """Resize an original into every derivative size and format.
+
+    Runs in a worker process; reads the original from disk and writes the
+    derivatives straight into the store so no image bytes cross the pool.
+    Returns the original's dimensions and the keys written.
+    """
+    store = LocalImageStore(store_root)
+    written = []
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # Largest first, each size is downscaled from the previous one
+        for size in DERIVATIVE_SIZES:
+            image = image.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+
+            for extension, (format_name, options) in DERIVATIVE_FORMATS.items():
+                frame = image
+                if format_name == "JPEG" and frame.mode == "RGBA":
+                    background = Image.new("RGB", frame.size, (255, 255, 255))
+                    background.paste(frame, mask=frame.getchannel("A"))
+                    frame = background
+
+                buffer = io.BytesIO()
+                frame.save(buffer, format_name, **options)
+                key = derivative_key(content_hash, size, extension)
+                store.put_bytes(key, buffer.getvalue())
+                written.append(key)
+
+    return {"width": width, "height": height, "keys": written}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.image_derivative_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next job starts a fresh one."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def create_derivatives(key: str) -> Optional[dict]:
+    """Generate derivatives for a stored original in the process pool.
+
+    Waits at most `image_derivative_timeout` seconds so upload latency stays
+    bounded under load; slow jobs keep running and their derivatives show up
+    in listings once written. A pool broken by a dying worker is replaced
+    and the job retried once. Never raises: returns the worker's result,
+    or None if it failed, is unavailable or still pending.
+    """
+    match = IMAGE_KEY_RE.match(key)
+    if not PIL_AVAILABLE or not match or match.group(2):
+        return None
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            future = loop.run_in_executor(
+                executor,
+                generate_derivatives,
+                image_store.path_for(key),
+                image_store.root,
+                match.group(1),
+            )
+            future.add_done_callback(_log_failure)
+            return await asyncio.wait_for(
+                asyncio.shield(future), timeout=settings.image_derivative_timeout
+            )
+        except BrokenProcessPool as e:
+            logger.warning(f"Derivative pool broken ({e}), starting a new one")
+            _discard_executor(executor)
+        except asyncio.TimeoutError:
+            logger.warning(f"Derivatives for {key} still pending after timeout")
+            return None
+        except Exception as e:
+            logger.warning(f"Derivatives for {key} failed: {e}")
+            return None
+
+    return None
+
+
+def _log_failure(future) -> None:
+    if not future.cancelled() and future.exception():
+        logger.error(f"Derivative generation failed: {future.exception()}")
+
+
+def derivative_urls(image_url: Optional[str]) -> Optional[dict]:
+    """Derivative URLs for a stored original, or None if there are none yet."""
+    key = image_key_from_url(image_url)
+    if not key:
+        return None
+
+    match = IMAGE_KEY_RE.match(key)
+    if match.group(2):
+        return None
+    content_hash = match.group(1)
+    # The smallest derivative is written last, so it marks a complete set
+    if not image_store.exists(derivative_key(content_hash, DERIVATIVE_SIZES[-1], "jpg")):
+        return None
+
+    return {
+        str(size): {
+            extension: image_url_for(derivative_key(content_hash, size, extension))
+            for extension in DERIVATIVE_FORMATS
+        }
+        for size in DERIVATIVE_SIZES
+    }
+
+
+def derivative_keys(content_hash: str) -> list[str]:
+    return [
+        derivative_key(content_hash, size, extension)
+        for size in DERIVATIVE_SIZES
+        for extension in DERIVATIVE_FORMATS
+    ]
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import BinaryIO, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_db_connection
+from app.utils.image_store import image_store, content_hash_of
+from app.utils.image_derivatives import derivative_keys
+
+logger = logging.getLogger(__name__)
+
+# Uploads that no post has referenced yet are kept this long before collection
+UNREFERENCED_GRACE_HOURS = 24
+
+
+async def find_image(content_hash: str, db):
+    """Look up a registered image, marking it as recently used.
+
+    Touching last_referenced_at keeps the garbage collector away from an
+    image that was just handed out again for a new post.
+    """
+    return await db.fetchrow(
+        """
+        UPDATE images SET last_referenced_at = NOW()
+        WHERE hash = $1
+        RETURNING hash, image_key, mime_type, size_bytes, width, height
+        """,
+        content_hash,
+    )
+
+
+async def register_image(
+    key: str,
+    mime_type: str,
+    size_bytes: int,
+    db,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+) -> str:
+    """Record an image and return the canonical key for its content.
+
+    An existing row is marked as recently used, which keeps the garbage
+    collector off it, and gains any dimensions it was missing. Items
+    reference images by key; reference counts are maintained by triggers
+    on items and posts (see migration 004).
+    """
+    return await db.fetchval(
+        """
+        INSERT INTO images (hash, image_key, mime_type, size_bytes, width, height)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        ON CONFLICT (hash) DO UPDATE
+        SET last_referenced_at = NOW(),
+            width = COALESCE(images.width, EXCLUDED.width),
+            height = COALESCE(images.height, EXCLUDED.height)
+        RETURNING image_key
+        """,
+        content_hash_of(key),
+        key,
+        mime_type,
+        size_bytes,
+        width,
+        height,
+    )
+
+
+async def store_image(
+    key: str, mime_type: str, size_bytes: int, source: BinaryIO, db
+) -> str:
+    """Register an image, then make sure its blob is in the store.
+
+    Registering first claims the row, so the garbage collector cannot
+    delete a blob that this upload is about to reuse; returns the
+    canonical key, as `register_image` does.
+    """
+    key = await register_image(key, mime_type, size_bytes, db) or key
+    await run_in_threadpool(image_store.put_file, key, source)
+    return key
+
+
+async def set_image_dimensions(key: str, width: int, height: int, db) -> None:
+    await db.execute(
+        "UPDATE images SET width = $2, height = $3 WHERE hash = $1",
+        content_hash_of(key),
+        width,
+        height,
+    )
+
+
+UNREFERENCED_QUERY = """
+    SELECT hash, image_key FROM images
+    WHERE ref_count = 0
+      AND last_referenced_at < NOW() - make_interval(hours => $1)
+"""
+
+
+async def collect_unreferenced_images(db, grace_hours: int = UNREFERENCED_GRACE_HOURS) -> int:
+    """Delete images no live post references, along with their blobs.
+
+    Each image is locked and re-checked before its blobs are unlinked, and
+    the row is only released once they are gone, so an upload claiming it
+    concurrently either keeps it or finds it gone and writes the blob again.
+    """
+    candidates = await db.fetch(UNREFERENCED_QUERY, grace_hours)
+
+    removed = 0
+    for candidate in candidates:
+        async with db.transaction():
+            image = await db.fetchrow(
+                f"{UNREFERENCED_QUERY} AND hash = $2 FOR UPDATE",
+                grace_hours,
+                candidate["hash"],
+            )
+            if image is None:
+                # Referenced or reused since the scan
+                continue
+            for key in [image["image_key"], *derivative_keys(image["hash"])]:
+                await run_in_threadpool(image_store.delete, key)
+            await db.execute("DELETE FROM images WHERE hash = $1", image["hash"])
+            removed += 1
+
+    if removed:
+        logger.info(f"Collected {removed} unreferenced images")
+    return removed
+
+
+async def image_gc_loop(interval_seconds: int) -> None:
+    """Periodically collect unreferenced images until cancelled."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with get_db_connection() as db:
+                await collect_unreferenced_images(db)
+        except Exception as e:
+            logger.warning(f"Image garbage collection failed: {e}")
@@ -0,0 +1,218 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+from typing import BinaryIO, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+Image = None
+try:
+    from PIL import Image
+
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+EXTENSIONS_BY_TYPE = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+CONTENT_TYPES_BY_EXTENSION = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+# <hash>.<ext> for originals, <hash>_<size>.<ext> for derivatives
+IMAGE_KEY_RE = re.compile(r"^([0-9a-f]{64})(?:_(\d+))?\.(jpg|png|webp)$")
+
+DATA_URL_RE = re.compile(r"^data:(image/[a-z0-9.+-]+);base64,", re.IGNORECASE)
+
+
+class ImageTooLargeError(ValueError):
+    """The image is over the size limit it was checked against."""
+
+
+class LocalImageStore:
+    """Content-addressed blob store on the local filesystem.
+
+    Blobs are written once under `<root>/<hash[:2]>/<key>`, so identical
+    uploads share a single file.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def put_file(self, key: str, source: BinaryIO) -> bool:
+        """Store `source` under `key`; returns False if it was already stored."""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return False
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                source.seek(0)
+                shutil.copyfileobj(source, tmp)
+            # Atomic, so readers never see a partially written blob
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+
+    def put_bytes(self, key: str, data: bytes) -> bool:
+        return self.put_file(key, io.BytesIO(data))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+
+image_store = LocalImageStore(settings.image_storage_dir)
+
+
+def image_key(content_hash: str, extension: str) -> str:
+    return f"{content_hash}.{extension}"
+
+
+# Path stored in items.image_url; the public prefix is applied per response
+IMAGE_PATH = "/api/v1/images"
+
+
+def image_path_for(key: str) -> str:
+    return f"{IMAGE_PATH}/{key}"
+
+
+def image_url_for(key: str) -> str:
+    """Public URL of a stored image, under `image_base_url`."""
+    return f"{settings.image_base_url.rstrip('/')}/{key}"
+
+
+def public_image_url(url: Optional[str]) -> Optional[str]:
+    """Public URL for a stored items.image_url value.
+
+    Store URLs are rebuilt from their key, which also repairs rows saved
+    with an absolute prefix; external URLs pass through unchanged.
+    """
+    key = image_key_from_url(url)
+    return image_url_for(key) if key else url
+
+
+def image_key_from_url(url: Optional[str]) -> Optional[str]:
+    """Return the store key if `url` points at an image in the store."""
+    if not url or "/" not in url:
+        return None
+    key = url.rsplit("/", 1)[1]
+    return key if IMAGE_KEY_RE.match(key) else None
+
+
+def extension_for(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    if content_type and content_type.lower() in EXTENSIONS_BY_TYPE:
+        return EXTENSIONS_BY_TYPE[content_type.lower()]
+    if filename and "." in filename:
+        extension = filename.rsplit(".", 1)[1].lower()
+        if extension == "jpeg":
+            extension = "jpg"
+        if extension in CONTENT_TYPES_BY_EXTENSION:
+            return extension
+    return "jpg"
+
+
+def is_data_url(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith("data:")
+
+
+def decode_data_url(data_url: str, max_size: Optional[int] = None) -> tuple[str, bytes]:
+    """Split a base64 image data URL into its content type and bytes.
+
+    With `max_size`, oversized payloads raise ImageTooLargeError before
+    they are decoded.
+    """
+    match = DATA_URL_RE.match(data_url)
+    if not match:
+        raise ValueError("Unsupported data URL")
+    encoded_size = len(data_url) - match.end()
+    if max_size is not None and encoded_size // 4 * 3 - 2 > max_size:
+        raise ImageTooLargeError(f"Image must be under {max_size} bytes")
+    try:
+        data = base64.b64decode(data_url[match.end():], validate=True)
+    except binascii.Error as e:
+        raise ValueError("Invalid base64 image data") from e
+    if max_size is not None and len(data) > max_size:
+        raise ImageTooLargeError(f"Image must be under {max_size} bytes")
+    return match.group(1).lower(), data
+
+
+def sniff_extension(header: bytes) -> Optional[str]:
+    """Extension of a stored format identified by its leading bytes."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def validate_image(source: BinaryIO) -> str:
+    """Check that `source` is a JPEG, PNG or WebP image; returns its extension.
+
+    The format comes from the magic bytes, not from what the client
+    claimed. With Pillow installed the image must also parse. Raises
+    ValueError otherwise.
+    """
+    source.seek(0)
+    extension = sniff_extension(source.read(12))
+    if extension is None:
+        raise ValueError("Only JPEG, PNG and WebP images are allowed")
+
+    if PIL_AVAILABLE:
+        source.seek(0)
+        try:
+            with Image.open(source, formats=["JPEG", "PNG", "WEBP"]) as image:
+                image.verify()
+        except Exception as e:
+            raise ValueError(f"Unreadable image: {e}") from e
+
+    source.seek(0)
+    return extension
+
+
+def read_data_url(data_url: str, max_size: Optional[int] = None) -> tuple[str, str, bytes]:
+    """Decode and validate a base64 image data URL without storing it.
+
+    Returns the store key, content type and image bytes; the caller
+    registers the key before writing the bytes (see `store_image`).
+    """
+    content_type, data = decode_data_url(data_url, max_size)
+    if content_type not in EXTENSIONS_BY_TYPE:
+        raise ValueError(f"Unsupported image type: {content_type}")
+    extension = validate_image(io.BytesIO(data))
+    key = image_key(hashlib.sha256(data).hexdigest(), extension)
+    return key, CONTENT_TYPES_BY_EXTENSION[extension], data
+
+
+def content_hash_of(key: str) -> str:
+    return key.split("_", 1)[0].split(".", 1)[0]
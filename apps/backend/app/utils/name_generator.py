@@ -230,6 +230,11 @@ async def get_or_create_display_name(ip_hash: str, post_id: str, db) -> str:
     if existing:
         return existing["display_name"]
 
+    return await create_display_name(ip_hash, post_id, db)
+
+
+async def create_display_name(ip_hash: str, post_id: str, db) -> str:
+    """Pick a free name for a first-time commenter and register it."""
     import hashlib
 
     seed = int(hashlib.md5(f"{ip_hash}:{post_id}".encode()).hexdigest(), 16)
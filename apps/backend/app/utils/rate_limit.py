@@ -0,0 +1,320 @@
+import fnmatch
+import hashlib
+import logging
+import mmap
+import os
+import stat
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.config import get_settings, RateLimitPolicy
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+redis_asyncio = None
+try:
+    import redis.asyncio as redis_asyncio
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+fcntl = None
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+def estimate_count(current: int, previous: int, now: float, window: int) -> float:
+    """Requests in the last `window` seconds, from two fixed-window counters.
+
+    The previous window's counter is weighted by how much of it still
+    overlaps the sliding window.
+    """
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class SlidingWindowLimiter:
+    """In-memory sliding-window counter rate limiter.
+
+    Each key keeps two counters, for the current and the previous fixed
+    window, so every check is O(1) with constant memory per key. Keys are
+    held in LRU order, idle keys are swept out periodically and the number
+    of tracked keys is capped. State is private to the process.
+    """
+
+    def __init__(self, window: int, max_keys: int = 100_000):
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [window index, current count, previous count]
+        self._counters: OrderedDict[str, list] = OrderedDict()
+        self._next_sweep = 0.0
+
+    async def hit(self, key: str, limit: int, cost: int = 1) -> bool:
+        return self.hit_sync(key, limit, cost)
+
+    def hit_sync(self, key: str, limit: int, cost: int = 1, now: Optional[float] = None) -> bool:
+        """Count a request of weight `cost` for `key` unless it exceeds `limit`."""
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+
+        if now >= self._next_sweep:
+            self._sweep(index)
+            self._next_sweep = now + self.window
+
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = [index, 0, 0]
+            self._counters[key] = counter
+            if len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+            if counter[0] != index:
+                previous = counter[1] if counter[0] == index - 1 else 0
+                counter[:] = [index, 0, previous]
+
+        if estimate_count(counter[1], counter[2], now, self.window) + cost > limit:
+            return False
+
+        counter[1] += cost
+        return True
+
+    def _sweep(self, index: int) -> None:
+        """Drop keys idle for two full windows; their estimate is zero."""
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if counter[0] >= index - 1:
+                break
+            del self._counters[key]
+
+    async def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+def _open_private_file(path: str) -> int:
+    """Open or create `path` without trusting anything else on the host.
+
+    The parent directory must belong to this user and be closed to
+    others, symlinks are never followed, and an existing file must be a
+    regular file owned by this user. Raises OSError otherwise.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise OSError(f"{directory} must be a directory private to this user")
+
+    flags = os.O_RDWR | os.O_NOFOLLOW
+    try:
+        fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        fd = os.open(path, flags)
+
+    info = os.fstat(fd)
+    if (
+        not stat.S_ISREG(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        os.close(fd)
+        raise OSError(f"{path} must be a regular file private to this user")
+    return fd
+
+
+# key hash, window index, current count, previous count
+_SLOT = struct.Struct("<QqQQ")
+# Slots examined for a key before the stalest one is recycled
+_PROBE_LENGTH = 8
+
+
+class SharedMemoryLimiter:
+    """Sliding-window counters in a memory-mapped file shared by all workers.
+
+    The table has a fixed number of slots, addressed by a hash of the key
+    with short linear probing. When every probed slot is live, the one
+    with the oldest window is recycled, so the slot count is a hard cap.
+    Each check holds an exclusive flock on the file, which makes the
+    read-check-increment atomic across processes. The file outlives
+    restarts, so limits do too.
+    """
+
+    def __init__(self, path: str, window: int, slots: int = 100_000):
+        self.window = window
+        self.slots = slots
+        size = _SLOT.size * slots
+
+        self._fd = _open_private_file(path)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                # A table of a different size cannot be reinterpreted
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    async def hit(self, key: str, limit: int, cost: int = 1) -> bool:
+        return self.hit_sync(key, limit, cost)
+
+    def hit_sync(self, key: str, limit: int, cost: int = 1, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        # Zero marks an empty slot, so real hashes are always odd
+        key_hash = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        ) | 1
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset, current, previous = self._find_slot(key_hash, index)
+            if estimate_count(current, previous, now, self.window) + cost > limit:
+                _SLOT.pack_into(self._map, offset, key_hash, index, current, previous)
+                return False
+            _SLOT.pack_into(self._map, offset, key_hash, index, current + cost, previous)
+            return True
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find_slot(self, key_hash: int, index: int) -> tuple[int, int, int]:
+        """Locate the key's slot; returns (offset, current, previous) for `index`.
+
+        The whole probe sequence is searched for the key before a free slot
+        is reused: a slot ahead of it may have been freed since it was
+        placed, and claiming that one would reset the key's count.
+        """
+        start = key_hash % self.slots
+        free_offset = None
+        victim_offset, victim_index = None, None
+
+        for probe in range(_PROBE_LENGTH):
+            offset = ((start + probe) % self.slots) * _SLOT.size
+            slot_hash, slot_index, current, previous = _SLOT.unpack_from(self._map, offset)
+
+            if slot_hash == key_hash:
+                if slot_index == index:
+                    return offset, current, previous
+                if slot_index == index - 1:
+                    return offset, 0, current
+                return offset, 0, 0
+
+            if slot_hash == 0 or slot_index < index - 1:
+                if free_offset is None:
+                    free_offset = offset
+            elif victim_index is None or slot_index < victim_index:
+                victim_offset, victim_index = offset, slot_index
+
+        if free_offset is not None:
+            return free_offset, 0, 0
+        return victim_offset, 0, 0
+
+    async def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+# Atomic sliding-window check-and-increment; returns 1 when allowed
+_REDIS_HIT_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+if previous * tonumber(ARGV[3]) + current + cost > limit then
+    return 0
+end
+redis.call('INCRBY', KEYS[1], cost)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class RedisRateLimiter:
+    """Sliding-window counters in Redis, shared by every worker and host.
+
+    The check and increment run as one Lua script, so concurrent requests
+    cannot both slip under a limit. If Redis is unreachable the request is
+    checked against an in-process limiter instead.
+    """
+
+    def __init__(self, url: str, window: int, fallback: SlidingWindowLimiter):
+        self.window = window
+        self.fallback = fallback
+        self._client: Any = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_HIT_SCRIPT)
+
+    async def hit(self, key: str, limit: int, cost: int = 1) -> bool:
+        now = time.time()
+        index = int(now // self.window)
+        weight = 1 - (now % self.window) / self.window
+        try:
+            allowed = await self._script(
+                keys=[f"ratelimit:{{{key}}}:{index}", f"ratelimit:{{{key}}}:{index - 1}"],
+                args=[limit, cost, weight, self.window * 2],
+            )
+            return bool(allowed)
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable: {e}")
+            return await self.fallback.hit(key, limit, cost)
+
+    async def close(self) -> None:
+        await self.fallback.close()
+        await self._client.aclose()
+
+
+DEFAULT_POLICY = RateLimitPolicy(name="default")
+
+
+def match_policy(
+    method: str, path: str, query_params, policies: list[RateLimitPolicy]
+) -> RateLimitPolicy:
+    """First policy matching the request, or the default policy."""
+    for policy in policies:
+        if policy.methods and method not in policy.methods:
+            continue
+        if not fnmatch.fnmatchcase(path, policy.path):
+            continue
+        if any(query_params.get(k) != v for k, v in policy.query.items()):
+            continue
+        return policy
+    return DEFAULT_POLICY
+
+
+def create_rate_limiter():
+    """Pick the most widely shared backend available.
+
+    Redis when `redis_url` is set, otherwise a table shared by the workers
+    on this host, otherwise per-process memory.
+    """
+    window = settings.rate_limit_window
+    local = SlidingWindowLimiter(window, max_keys=settings.rate_limit_max_keys)
+
+    if REDIS_AVAILABLE and settings.redis_url:
+        try:
+            return RedisRateLimiter(settings.redis_url, window, local)
+        except Exception as e:
+            logger.warning(f"Could not set up Redis rate limiter: {e}")
+
+    if FCNTL_AVAILABLE and settings.rate_limit_state_file:
+        try:
+            return SharedMemoryLimiter(
+                settings.rate_limit_state_file, window, slots=settings.rate_limit_max_keys
+            )
+        except OSError as e:
+            logger.warning(f"Could not open shared rate limit table: {e}")
+
+    return local
@@ -0,0 +1,83 @@
+import functools
+import inspect
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable
+from uuid import UUID
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+orjson = None
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Encode to JSON bytes; datetimes, dates and UUIDs are handled natively."""
+    if orjson:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(
+        value, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _render_directly(endpoint: Callable, status_code: int) -> Callable:
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, Response):
+            return content
+        return FastJSONResponse(content, status_code=status_code)
+
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    """Route that renders plain return values with FastJSONResponse.
+
+    FastAPI otherwise runs every returned dict through jsonable_encoder
+    before rendering it, which walks and copies the whole payload. Routes
+    that declare a response model keep FastAPI's validation path.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model")
+        untyped = (
+            response_model is None or isinstance(response_model, DefaultPlaceholder)
+        ) and inspect.signature(endpoint).return_annotation is inspect.Signature.empty
+
+        if untyped and inspect.iscoroutinefunction(endpoint):
+            endpoint = _render_directly(endpoint, kwargs.get("status_code") or 200)
+
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,138 @@
+import hashlib
+from tempfile import SpooledTemporaryFile
+from typing import Optional
+
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Uploads stay in memory up to this size, then spill to a temp file
+SPOOL_MEMORY_SIZE = 1024 * 1024
+
+# Room for boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class InvalidMultipartError(Exception):
+    pass
+
+
+class SpooledUpload:
+    """A single file field received from a multipart body.
+
+    The content lives in a bounded spool and its hash is computed while
+    the body streams in, so the upload is never held in memory twice.
+    """
+
+    def __init__(self, filename: Optional[str], content_type: Optional[str]):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.file = SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+        self._hash = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        self._hash.update(data)
+        self.file.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+async def receive_upload(
+    request: Request, field_name: str, max_size: int
+) -> Optional[SpooledUpload]:
+    """Stream a multipart request body and spool the file in `field_name`.
+
+    Raises UploadTooLargeError as soon as the file grows past `max_size`,
+    without reading the rest of the body.
+    """
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise InvalidMultipartError("missing boundary")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLargeError()
+
+    upload: Optional[SpooledUpload] = None
+    capturing = False
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        nonlocal upload, capturing
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", errors="ignore")
+        capturing = upload is None and name == field_name
+        if capturing:
+            filename = disposition.get(b"filename")
+            content_type = headers.get(b"content-type")
+            upload = SpooledUpload(
+                filename.decode("utf-8", errors="ignore") if filename else None,
+                content_type.decode("latin-1").strip() if content_type else None,
+            )
+
+    def on_part_data(data, start, end):
+        if not capturing:
+            return
+        if upload.size + (end - start) > max_size:
+            raise UploadTooLargeError()
+        upload.write(data[start:end])
+
+    def on_part_end():
+        nonlocal capturing
+        capturing = False
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except UploadTooLargeError:
+        if upload:
+            upload.close()
+        raise
+    except Exception as e:
+        if upload:
+            upload.close()
+        raise InvalidMultipartError(str(e)) from e
+
+    return upload
@@ -1,7 +1,8 @@
 import hashlib
 import os
 import secrets
-from fastapi import Request
+from uuid import UUID
+from fastapi import HTTPException, Request
 
 
 def get_client_ip(request: Request) -> str:
@@ -16,6 +17,18 @@ def get_client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
+def canonical_uuid(value: str, not_found_detail: str) -> str:
+    """Lowercase hyphenated form of a path id; anything else is a 404.
+
+    Ids feed cache keys and generations, so every spelling of one id has
+    to map to the same string.
+    """
+    try:
+        return str(UUID(value))
+    except ValueError:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+
 def generate_ip_hash(ip_address: str, post_id: str, salt: str = None, browser_id: str = None) -> str:
     if salt is None:
         salt = os.getenv("HASH_SALT", "rateit-secret-salt")
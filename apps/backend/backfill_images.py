@@ -0,0 +1,224 @@
+"""
+Move base64 data URLs out of items.image_url into the image store.
+
+Rows are streamed in keyset order (by id) through a server-side cursor, a
+batch at a time, and each row is rewritten to a short image URL as soon as
+its image is stored. Progress is checkpointed after every batch, so the
+command can be stopped and resumed at any time. The checkpoint only moves
+past rows that migrated; if any row fails, the run stops at the first
+failure and exits non-zero, and the next run retries from there.
+
+The data URL is the only copy of each image, so the command refuses to run
+unless IMAGE_STORAGE_DURABLE says the store survives restarts, and a row is
+only rewritten once its blob is on disk.
+
+Usage:
+    python backfill_images.py --batch-size 200 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+from typing import Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.database import _get_ssl_context, _init_connection
+from app.utils.image_store import read_data_url, image_path_for, image_store
+from app.utils.image_derivatives import create_derivatives, shutdown_executor
+from app.utils.image_registry import store_image, set_image_dimensions
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("backfill_images")
+
+settings = get_settings()
+
+
+def load_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_id": None, "migrated": 0, "skipped": 0, "failed": 0}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def migrate_row(row, pool, checkpoint: dict, derivatives: bool) -> None:
+    try:
+        key, content_type, data = await asyncio.to_thread(read_data_url, row["image_url"])
+    except ValueError as e:
+        logger.warning(f"Skipping item {row['id']}: {e}")
+        checkpoint["skipped"] += 1
+        return
+
+    # Registered before the row points at it, so the items trigger counts the reference
+    key = await store_image(key, content_type, len(data), io.BytesIO(data), pool)
+    if not await asyncio.to_thread(image_store.exists, key):
+        raise RuntimeError(f"{key} is not in the image store")
+
+    derived = await create_derivatives(key) if derivatives else None
+    if derived:
+        await set_image_dimensions(key, derived["width"], derived["height"], pool)
+
+    # Guard on the old value's prefix so a concurrent edit is never clobbered
+    await pool.execute(
+        """
+        UPDATE items SET image_url = $1, image_key = $2
+        WHERE id = $3 AND image_url LIKE 'data:%'
+        """,
+        image_path_for(key),
+        key,
+        row["id"],
+    )
+    checkpoint["migrated"] += 1
+
+
+async def backfill_batch(
+    conn, pool, last_id: Optional[str], batch_size: int, concurrency: int,
+    checkpoint: dict, derivatives: bool,
+) -> tuple[Optional[str], int, int]:
+    """Migrate one batch; returns the last id safe to checkpoint, rows seen and failures."""
+    semaphore = asyncio.Semaphore(concurrency)
+    # (row id, task) in id order; every task is kept until gathered
+    tasks = []
+
+    async def run(row):
+        try:
+            await migrate_row(row, pool, checkpoint, derivatives)
+        finally:
+            semaphore.release()
+
+    # Cursors need a transaction; it is read-only and lasts one batch
+    async with conn.transaction(readonly=True):
+        cursor = conn.cursor(
+            """
+            SELECT id, image_url FROM items
+            WHERE image_url LIKE 'data:%'
+              AND ($1::uuid IS NULL OR id > $1)
+            ORDER BY id
+            LIMIT $2
+            """,
+            last_id,
+            batch_size,
+            prefetch=concurrency,
+        )
+        async for row in cursor:
+            # Bounded fan-out: at most `concurrency` images in flight
+            await semaphore.acquire()
+            tasks.append((row["id"], asyncio.create_task(run(row))))
+
+    results = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+
+    failed = 0
+    for (row_id, _), result in zip(tasks, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to migrate item {row_id}: {result!r}")
+            failed += 1
+        elif not failed:
+            # Rows after a failure are done but not checkpointed; they no
+            # longer match the data: filter, so a rerun will not redo them
+            last_id = row_id
+
+    return last_id, len(tasks), failed
+
+
+async def backfill(args) -> bool:
+    if not settings.image_storage_durable and not args.allow_ephemeral_storage:
+        logger.error(
+            f"{settings.image_storage_dir} is not marked durable "
+            f"(IMAGE_STORAGE_DURABLE); refusing to move the only copy of each "
+            f"image there. Pass --allow-ephemeral-storage for local testing."
+        )
+        return False
+
+    checkpoint = {"last_id": None, "migrated": 0, "skipped": 0, "failed": 0}
+    if not args.reset:
+        checkpoint = load_checkpoint(args.checkpoint)
+        checkpoint.setdefault("failed", 0)
+    if checkpoint["last_id"]:
+        logger.info(f"Resuming after item {checkpoint['last_id']}")
+
+    ssl_ctx = _get_ssl_context()
+    conn = await asyncpg.connect(args.database_url, ssl=ssl_ctx)
+    await _init_connection(conn)
+    pool = await asyncpg.create_pool(
+        args.database_url,
+        min_size=1,
+        max_size=args.concurrency,
+        ssl=ssl_ctx,
+        init=_init_connection,
+    )
+
+    try:
+        while True:
+            last_id, seen, failed = await backfill_batch(
+                conn,
+                pool,
+                checkpoint["last_id"],
+                args.batch_size,
+                args.concurrency,
+                checkpoint,
+                args.derivatives,
+            )
+            if seen == 0:
+                break
+
+            checkpoint["last_id"] = last_id
+            checkpoint["failed"] += failed
+            save_checkpoint(args.checkpoint, checkpoint)
+            logger.info(
+                f"Batch done: {seen} rows, {checkpoint['migrated']} migrated, "
+                f"{checkpoint['skipped']} skipped, {failed} failed, last id {last_id}"
+            )
+
+            if failed:
+                logger.error(
+                    f"{failed} row(s) failed; stopping so they are retried on the next run"
+                )
+                break
+            if seen < args.batch_size:
+                break
+    finally:
+        await conn.close()
+        await pool.close()
+        shutdown_executor()
+
+    logger.info(
+        f"Backfill finished: {checkpoint['migrated']} migrated, "
+        f"{checkpoint['skipped']} skipped, {checkpoint['failed']} failed"
+    )
+    return failed == 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint", default="backfill_images.checkpoint.json")
+    parser.add_argument(
+        "--reset", action="store_true", help="ignore any saved checkpoint"
+    )
+    parser.add_argument(
+        "--derivatives", action="store_true", help="also generate thumbnails"
+    )
+    parser.add_argument(
+        "--allow-ephemeral-storage",
+        action="store_true",
+        help="run even though the image store is not marked durable",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    if not asyncio.run(backfill(parse_args())):
+        raise SystemExit(1)
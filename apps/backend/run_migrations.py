@@ -29,6 +29,15 @@ async def run_migrations():
         await conn.execute(migration_sql)
         print("Migration 003 completed!")
         
+        # Read migration file 004
+        print("\nRunning migration 004...")
+        with open("../database/migrations/004_images.sql", "r") as f:
+            migration_sql = f.read()
+        
+        # Execute migration
+        await conn.execute(migration_sql)
+        print("Migration 004 completed!")
+        
         print("\nAll migrations completed successfully!")
         
     except Exception as e:
@@ -2,11 +2,10 @@ import asyncio
 import sys
 sys.path.insert(0, '.')
 
-from app.database import get_db
+from app.database import LazyConnection
 
 async def test():
-    db_gen = get_db()
-    db = await db_gen.__anext__()
+    db = LazyConnection()
     
     try:
         # Check total posts
@@ -0,0 +1,78 @@
+-- Registry of uploaded images, keyed by content hash
+-- Lets duplicate uploads reuse the stored blob and lets unreferenced blobs be garbage collected
+
+CREATE TABLE IF NOT EXISTS images (
+    hash CHAR(64) PRIMARY KEY,
+    image_key VARCHAR(80) NOT NULL,
+    mime_type VARCHAR(32) NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_referenced_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Index for the garbage collector's scan of unreferenced images
+CREATE INDEX IF NOT EXISTS idx_images_unreferenced
+    ON images(last_referenced_at) WHERE ref_count = 0;
+
+-- Items reference images by store key (<hash>.<ext>)
+CREATE INDEX IF NOT EXISTS idx_items_image_key ON items(image_key) WHERE image_key IS NOT NULL;
+
+-- Count a reference whenever an item starts or stops pointing at an image.
+-- Hard deletes are not counted: the app only soft-deletes posts, and a leaked
+-- reference only delays collection, whereas a lost one would delete a live blob.
+CREATE OR REPLACE FUNCTION track_item_image_refs()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.image_key IS NOT NULL THEN
+        UPDATE images
+        SET ref_count = GREATEST(ref_count - 1, 0)
+        WHERE hash = split_part(OLD.image_key, '.', 1);
+    END IF;
+
+    IF NEW.image_key IS NOT NULL THEN
+        UPDATE images
+        SET ref_count = ref_count + 1, last_referenced_at = NOW()
+        WHERE hash = split_part(NEW.image_key, '.', 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_item_image_refs ON items;
+CREATE TRIGGER trigger_item_image_refs
+AFTER INSERT OR UPDATE OF image_key ON items
+FOR EACH ROW
+EXECUTE FUNCTION track_item_image_refs();
+
+-- Removing a post (user, admin or report auto-hide) releases its images; restoring it takes them back
+CREATE OR REPLACE FUNCTION track_post_image_refs()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE images i
+    SET ref_count = CASE
+            WHEN NEW.is_removed THEN GREATEST(i.ref_count - r.refs, 0)
+            ELSE i.ref_count + r.refs
+        END,
+        last_referenced_at = NOW()
+    FROM (
+        SELECT split_part(image_key, '.', 1) AS hash, COUNT(*) AS refs
+        FROM items
+        WHERE post_id = NEW.id AND image_key IS NOT NULL
+        GROUP BY 1
+    ) r
+    WHERE i.hash = r.hash;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_post_image_refs ON posts;
+CREATE TRIGGER trigger_post_image_refs
+AFTER UPDATE OF is_removed ON posts
+FOR EACH ROW
+WHEN (COALESCE(OLD.is_removed, FALSE) <> COALESCE(NEW.is_removed, FALSE))
+EXECUTE FUNCTION track_post_image_refs();